@@ -1,8 +1,55 @@
+import atexit
+import click
 from flask import Flask, jsonify
 from flask_cors import CORS
 from config import config
+from json_provider import ORJSONProvider
 from models import db
+import functools
+import importlib
+import json
+import logging
+import logging.handlers
 import os
+import queue
+import time
+
+# (name, module, blueprint attribute, url prefix, description)
+BLUEPRINTS = (
+    ('auth', 'routes.auth', 'auth_bp', '/api/auth', 'Authentication endpoints'),
+    ('trips', 'routes.trips', 'trips_bp', '/api/trips', 'Trip management'),
+    ('users', 'routes.users', 'users_bp', '/api/users', 'User profiles'),
+    ('messages', 'routes.messages', 'messages_bp', '/api/messages', 'Messaging system'),
+    ('reviews', 'routes.reviews', 'reviews_bp', '/api/reviews', 'User reviews'),
+)
+
+# Endpoint listings served by /api, /api/health and the 404 handler
+API_ENDPOINTS = {name: url_prefix for name, _, _, url_prefix, _ in BLUEPRINTS}
+API_ENDPOINT_DESCRIPTIONS = {
+    name: f"{url_prefix} - {description}"
+    for name, _, _, url_prefix, description in BLUEPRINTS
+}
+
+# How long /api/health reuses its last database ping
+HEALTH_CHECK_CACHE_SECONDS = 5
+
+# Error payloads are constant, so serialize them once at import time
+
+
+def _error_response(status, error, message, **extra):
+    """Pre-serialize an error payload as (body, status)"""
+    body = json.dumps({"error": error, "message": message, **extra}).encode()
+    return body, status
+
+
+ERROR_RESPONSES = {
+    404: _error_response(404, "Not Found", "The requested resource was not found.",
+                         endpoints=API_ENDPOINTS),
+    500: _error_response(500, "Internal Server Error", "An internal server error occurred."),
+    400: _error_response(400, "Bad Request", "The request could not be understood by the server."),
+    401: _error_response(401, "Unauthorized", "Authentication is required to access this resource."),
+    403: _error_response(403, "Forbidden", "You don't have permission to access this resource.")
+}
 
 
 def create_app():
@@ -13,20 +60,35 @@ def create_app():
     config_name = os.getenv('FLASK_ENV', 'development')
     app.config.from_object(config[config_name])
 
-    # Initialize extensions
-    db.init_app(app)
+    # Startup chatter only in debug; warnings and errors always get through
+    app.logger.setLevel(logging.INFO if app.debug else logging.WARNING)
+    register_log_queue(app)
 
-    # Configure CORS
-    CORS(app, origins=app.config['CORS_ORIGINS'])
+    # Serialize every jsonify() response with orjson
+    app.json = ORJSONProvider(app)
 
-    # Create tables within application context
-    with app.app_context():
-        try:
-            db.create_all()
-            print("✅ Database tables created successfully")
-        except Exception as e:
-            print(f"⚠️ Database initialization warning: {e}")
-            # Continue anyway - tables might already exist
+    # Initialize extensions - init_app builds this app's single Engine
+    db.init_app(app)
+    register_fork_handlers(app)
+
+    # Configure CORS - cache preflight responses so browsers don't re-send
+    # OPTIONS before every cross-origin API call
+    CORS(
+        app,
+        resources={r"/api/*": {"origins": app.config['CORS_ORIGINS']}},
+        max_age=app.config['CORS_MAX_AGE'],
+        methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
+        allow_headers=['Authorization', 'Content-Type'],
+        supports_credentials=False
+    )
+
+    # Creating tables costs schema round-trips on every worker boot, so only
+    # do it when asked (RUN_MIGRATIONS=1) - otherwise run `flask init-db` once
+    if app.config['RUN_MIGRATIONS']:
+        init_db(app)
+
+    # Register CLI commands
+    register_commands(app)
 
     # Register blueprints
     register_blueprints(app)
@@ -37,80 +99,110 @@ def create_app():
     return app
 
 
-def register_blueprints(app):
-    """Register application blueprints"""
-    try:
-        from routes.auth import auth_bp
-        app.register_blueprint(auth_bp, url_prefix='/api/auth')
-        print("✅ Auth blueprint registered successfully")
-    except ImportError as e:
-        print(f"⚠️ Auth blueprint not found: {e}")
+# Logger name -> the QueueListener draining it. Flask apps built from the same
+# import name share one logger, so a repeated create_app() reuses its listener
+_log_listeners = {}
 
-    try:
-        from routes.trips import trips_bp
-        app.register_blueprint(trips_bp, url_prefix='/api/trips')
-        print("✅ Trips blueprint registered successfully")
-    except ImportError as e:
-        print(f"⚠️ Trips blueprint not found: {e}")
 
-    try:
-        from routes.users import users_bp
-        app.register_blueprint(users_bp, url_prefix='/api/users')
-        print("✅ Users blueprint registered successfully")
-    except ImportError as e:
-        print(f"⚠️ Users blueprint not found: {e}")
+def register_log_queue(app):
+    """Write app.logger records from a background thread.
+
+    Request threads only enqueue the record, so a burst of errors doesn't
+    serialize requests on the stderr lock and its synchronous writes.
+    """
+    if app.logger.name in _log_listeners:
+        return
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(records, *app.logger.handlers, respect_handler_level=True)
+    app.logger.handlers = [logging.handlers.QueueHandler(records)]
+    listener.start()
+    _log_listeners[app.logger.name] = listener
+
+
+def _stop_log_listeners():
+    for listener in _log_listeners.values():
+        listener.stop()
+
+
+def _restart_log_listeners():
+    # Threads don't survive fork, so each worker drains its queues with
+    # fresh listeners over the same handlers
+    for name, listener in _log_listeners.items():
+        _log_listeners[name] = logging.handlers.QueueListener(
+            listener.queue, *listener.handlers, respect_handler_level=True
+        )
+        _log_listeners[name].start()
+
+
+atexit.register(_stop_log_listeners)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_log_listeners)
 
-    try:
-        from routes.messages import messages_bp
-        app.register_blueprint(messages_bp, url_prefix='/api/messages')
-        print("✅ Messages blueprint registered successfully")
-    except ImportError as e:
-        print(f"⚠️ Messages blueprint not found: {e}")
+
+def register_fork_handlers(app):
+    """Give forked worker processes fresh connection pools"""
+    with app.app_context():
+        engines = list(db.engines.values())
+
+    def dispose_inherited_pools():
+        # close=False leaves the parent's sockets alone; the child just
+        # stops using them and opens its own on demand
+        for engine in engines:
+            engine.dispose(close=False)
+
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=dispose_inherited_pools)
+
+
+def init_db(app):
+    """Create database tables"""
+    with app.app_context():
+        try:
+            db.create_all()
+            app.logger.info("Database tables created successfully")
+        except Exception as e:
+            app.logger.warning("Database initialization warning: %s", e)
+            # Continue anyway - tables might already exist
+
+
+def register_commands(app):
+    """Register Flask CLI commands"""
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create all database tables."""
+        init_db(app)
+        click.echo("Database initialization finished")
+
+
+def register_blueprints(app):
+    """Register application blueprints"""
+    for name, module_name, attr, url_prefix, _ in BLUEPRINTS:
+        try:
+            # Import lazily so a broken or missing route module only
+            # disables its own blueprint
+            blueprint = getattr(importlib.import_module(module_name), attr)
+            app.register_blueprint(blueprint, url_prefix=url_prefix)
+            app.logger.info("%s blueprint registered", name.capitalize())
+        except ImportError as e:
+            app.logger.warning("%s blueprint not found: %s", name.capitalize(), e)
 
 
 def register_error_handlers(app):
     """Register error handlers"""
 
-    @app.errorhandler(404)
-    def not_found(error):
-        return jsonify({
-            "error": "Not Found",
-            "message": "The requested resource was not found.",
-            "endpoints": {
-                "auth": "/api/auth",
-                "trips": "/api/trips",
-                "users": "/api/users",
-                "messages": "/api/messages"
-            }
-        }), 404
-
-    @app.errorhandler(500)
-    def internal_error(error):
-        return jsonify({
-            "error": "Internal Server Error",
-            "message": "An internal server error occurred."
-        }), 500
-
-    @app.errorhandler(400)
-    def bad_request(error):
-        return jsonify({
-            "error": "Bad Request",
-            "message": "The request could not be understood by the server."
-        }), 400
-
-    @app.errorhandler(401)
-    def unauthorized(error):
-        return jsonify({
-            "error": "Unauthorized",
-            "message": "Authentication is required to access this resource."
-        }), 401
-
-    @app.errorhandler(403)
-    def forbidden(error):
-        return jsonify({
-            "error": "Forbidden",
-            "message": "You don't have permission to access this resource."
-        }), 403
+    response_class = app.response_class
+
+    # Build a fresh Response around the cached body each time - a shared
+    # instance can't be reused because after_request hooks (CORS) add
+    # per-request headers to it
+    def make_handler(body, status):
+        def handle_error(error):
+            return response_class(body, status=status, mimetype='application/json')
+        return handle_error
+
+    for status, (body, _) in ERROR_RESPONSES.items():
+        app.register_error_handler(status, make_handler(body, status))
 
 
 # Create app instance
@@ -132,42 +224,37 @@ def health_check():
 def api_info():
     return jsonify({
         "message": "Cargo Hitching API",
-        "endpoints": {
-            "auth": "/api/auth",
-            "trips": "/api/trips",
-            "users": "/api/users",
-            "messages": "/api/messages"
-        }
+        "endpoints": API_ENDPOINTS
     })
 
 
-@app.route('/api/health')
-def detailed_health():
+@functools.lru_cache(maxsize=1)
+def _database_status(time_bucket):
+    """Ping the database - cached per time bucket so probe storms share one check"""
     try:
-        # Test database connection - FIXED FOR SQLALCHEMY 2.0
+        # Test database connection on a short-lived connection; SELECT 1 is
+        # read-only so there is nothing to commit
         from sqlalchemy import text
-        db.session.execute(text('SELECT 1'))
-        db.session.commit()
-        db_status = "connected"
+        with db.engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+        return "connected"
     except Exception as e:
-        db_status = f"error: {str(e)}"
+        return f"error: {str(e)}"
+
+
+@app.route('/api/health')
+def detailed_health():
+    db_status = _database_status(int(time.time()) // HEALTH_CHECK_CACHE_SECONDS)
 
     return jsonify({
         "status": "healthy",
         "database": db_status,
         "environment": os.getenv('FLASK_ENV', 'development'),
-        "endpoints": {
-            "auth": "/api/auth - Authentication endpoints",
-            "trips": "/api/trips - Trip management",
-            "users": "/api/users - User profiles",
-            "messages": "/api/messages - Messaging system"
-        }
+        "endpoints": API_ENDPOINT_DESCRIPTIONS
     })
 
 
 if __name__ == '__main__':
-    import os
-
     # Get port from environment variable (Railway sets this)
     port = int(os.environ.get('PORT', 5000))
 
@@ -179,10 +266,8 @@ if __name__ == '__main__':
     print("   - Health check: /")
     print("   - API info: /api")
     print("   - Detailed health: /api/health")
-    print("   - Auth endpoints: /api/auth")
-    print("   - Trip endpoints: /api/trips")
-    print("   - User endpoints: /api/users")
-    print("   - Message endpoints: /api/messages")
+    for description in API_ENDPOINT_DESCRIPTIONS.values():
+        print(f"   - {description}")
 
     app.run(
         debug=debug_mode,
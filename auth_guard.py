@@ -1,7 +1,115 @@
-from functools import wraps
-from flask import request, jsonify, current_app
-import jwt
-from models import User
+import base64
+import hashlib
+import hmac
+import time
+import orjson
+from functools import lru_cache, wraps
+from typing import TYPE_CHECKING
+from flask import request, jsonify, current_app, g
+
+# jwt and models are imported on first use so that importing this module
+# (every route module does) stays cheap at startup
+if TYPE_CHECKING:
+    from models import User
+
+# HS256 signs through hmac/hashlib, which are backed by OpenSSL's EVP SHA-256
+# (SHA-NI / ARMv8 crypto extensions where the CPU has them), so there is
+# nothing to gain from routing it through another JWT library
+JWT_ALGORITHM = 'HS256'
+_JWT_ALGORITHMS = (JWT_ALGORITHM,)  # shared by every decode, never re-allocated
+# Tokens are signed here rather than through jwt.encode so the payload goes
+# through orjson instead of stdlib json; the header never changes
+_JWT_HEADER_B64 = base64.urlsafe_b64encode(b'{"alg":"HS256","typ":"JWT"}').rstrip(b'=')
+# Only exp/iat are ever set - skip the audience/issuer hooks entirely
+_JWT_DECODE_OPTIONS = {
+    'require': ['exp', 'iat'],
+    'verify_signature': True,
+    'verify_exp': True,
+    'verify_aud': False,
+    'verify_iss': False
+}
+
+
+def _jwt_key():
+    """JWT secret as bytes - encoded once per app rather than on every PyJWT call"""
+    key = current_app.extensions.get('jwt_key')
+    if key is None:
+        key = current_app.config['JWT_SECRET'].encode('utf-8')
+        current_app.extensions['jwt_key'] = key
+    return key
+
+
+@lru_cache(maxsize=10000)
+def _decode_access_token_cached(token, key, minute_bucket):
+    """Verify and decode an access token; successful results are memoized.
+
+    minute_bucket is only part of the cache key, so an entry is reused for
+    at most a minute. Failures raise and are never cached.
+    """
+    import jwt
+
+    data = jwt.decode(
+        token,
+        key,
+        algorithms=_JWT_ALGORITHMS,
+        options=_JWT_DECODE_OPTIONS
+    )
+
+    # Purpose-scoped tokens (e.g. email verification) can't authenticate
+    if 'purpose' in data:
+        raise jwt.InvalidTokenError('Not an access token')
+
+    return data
+
+
+def _encode_token(payload):
+    """Sign payload as an HS256 JWT (header.payload.signature)"""
+    signing_input = _JWT_HEADER_B64 + b'.' + base64.urlsafe_b64encode(orjson.dumps(payload)).rstrip(b'=')
+    signature = hmac.new(_jwt_key(), signing_input, hashlib.sha256).digest()
+    return (signing_input + b'.' + base64.urlsafe_b64encode(signature).rstrip(b'=')).decode('ascii')
+
+
+def decode_access_token(token):
+    """Decode an access token - raises jwt.InvalidTokenError if it isn't one.
+
+    The returned dict is shared between requests and must not be modified.
+    """
+    import jwt
+
+    now = time.time()
+    data = _decode_access_token_cached(token, _jwt_key(), int(now) // 60)
+
+    # A cache hit skips PyJWT's checks, so re-check expiry - the token may
+    # have expired since it was first decoded this minute
+    if data['exp'] <= now:
+        raise jwt.ExpiredSignatureError('Signature has expired')
+
+    return data
+
+
+def load_user(user_id):
+    """Get user by ID, cached on flask.g for the rest of the request"""
+    from models import User
+
+    user = g.get('current_user')
+    if user is None or user.id != user_id:
+        user = User.query.filter_by(id=user_id).first()
+        g.current_user = user
+    return user
+
+
+def _bearer_token():
+    """Token from an "Authorization: Bearer <token>" header.
+
+    Returns '' when there is no header and None when it isn't a Bearer
+    header; compares the fixed-size prefix instead of splitting.
+    """
+    auth_header = request.headers.get('Authorization')
+    if not auth_header:
+        return ''
+    if auth_header[:7].lower() != 'bearer ':
+        return None
+    return auth_header[7:]
 
 
 def token_required(f):
@@ -9,28 +117,22 @@ def token_required(f):
 
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        token = None
-        auth_header = request.headers.get('Authorization')
+        import jwt
 
-        if auth_header:
-            try:
-                token = auth_header.split(' ')[1]  # Bearer <token>
-            except IndexError:
-                return jsonify({'error': 'Invalid token format'}), 401
+        token = _bearer_token()
+
+        if token is None:
+            return jsonify({'error': 'Invalid token format'}), 401
 
         if not token:
             return jsonify({'error': 'Token is missing'}), 401
 
         try:
             # Decode the token
-            data = jwt.decode(
-                token,
-                current_app.config['JWT_SECRET'],
-                algorithms=['HS256']
-            )
+            data = decode_access_token(token)
 
             # Get user from database
-            current_user = User.query.filter_by(id=data['user_id']).first()
+            current_user = load_user(data['user_id'])
 
             if not current_user:
                 return jsonify({'error': 'Invalid token - user not found'}), 401
@@ -53,19 +155,16 @@ def optional_token(f):
 
     @wraps(f)
     def decorated_function(*args, **kwargs):
+        import jwt
+
         current_user = None
-        auth_header = request.headers.get('Authorization')
+        token = _bearer_token()
 
-        if auth_header:
+        if token:
             try:
-                token = auth_header.split(' ')[1]  # Bearer <token>
-                data = jwt.decode(
-                    token,
-                    current_app.config['JWT_SECRET'],
-                    algorithms=['HS256']
-                )
-                current_user = User.query.filter_by(id=data['user_id']).first()
-            except (IndexError, jwt.ExpiredSignatureError, jwt.InvalidTokenError):
+                data = decode_access_token(token)
+                current_user = load_user(data['user_id'])
+            except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
                 # Token is invalid, but that's okay for optional auth
                 pass
 
@@ -76,59 +175,56 @@ def optional_token(f):
 
 def generate_token(user):
     """Generate JWT token for user"""
-    import datetime
-
+    now = int(time.time())
     payload = {
         'user_id': user.id,
         'email': user.email,
-        'exp': datetime.datetime.utcnow() + datetime.timedelta(
-            hours=current_app.config.get('JWT_ACCESS_TOKEN_EXPIRES_HOURS', 24)
-        ),
-        'iat': datetime.datetime.utcnow()
+        'exp': now + current_app.config.get('JWT_ACCESS_TOKEN_EXPIRES_HOURS', 24) * 3600,
+        'iat': now
     }
 
-    return jwt.encode(
-        payload,
-        current_app.config['JWT_SECRET'],
-        algorithm='HS256'
-    )
+    return _encode_token(payload)
 
 
 def generate_verification_token(user):
     """Generate email verification token"""
-    import datetime
-
+    now = int(time.time())
     payload = {
         'user_id': user.id,
         'email': user.email,
         'purpose': 'email_verification',
-        'exp': datetime.datetime.utcnow() + datetime.timedelta(
-            hours=current_app.config.get('JWT_EMAIL_VERIFICATION_EXPIRES_HOURS', 48)
-        ),
-        'iat': datetime.datetime.utcnow()
+        'exp': now + current_app.config.get('JWT_EMAIL_VERIFICATION_EXPIRES_HOURS', 48) * 3600,
+        'iat': now
     }
 
-    return jwt.encode(
-        payload,
-        current_app.config['JWT_SECRET'],
-        algorithm='HS256'
-    )
+    return _encode_token(payload)
 
 
 def verify_verification_token(token):
     """Verify email verification token"""
+    import jwt
+
     try:
         data = jwt.decode(
             token,
-            current_app.config['JWT_SECRET'],
-            algorithms=['HS256']
+            _jwt_key(),
+            algorithms=_JWT_ALGORITHMS,
+            options=_JWT_DECODE_OPTIONS
         )
 
         if data.get('purpose') != 'email_verification':
             return None
 
-        user = User.query.filter_by(id=data['user_id']).first()
-        return user
+        return load_user(data['user_id'])
 
     except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
-        return None
\ No newline at end of file
+        return None
+
+
+def __getattr__(name):
+    """Resolve lazily imported names (PEP 562)"""
+    if name == 'User':
+        from models import User
+        globals()['User'] = User
+        return User
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -3,57 +3,78 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Snapshot the environment once - config values are fixed for the lifetime
+# of the process, so every setting below is read from this dict
+_ENV = dict(os.environ)
+
 
 class Config:
     """Base configuration class"""
 
     # Basic Flask config
-    SECRET_KEY = os.getenv('JWT_SECRET', 'fallback-secret-key')
+    SECRET_KEY = _ENV.get('JWT_SECRET', 'fallback-secret-key')
     DEBUG = False
     TESTING = False
 
     # Database config - UPDATED FOR POSTGRESQL
-    database_url = os.getenv('DATABASE_URL')
+    database_url = _ENV.get('DATABASE_URL')
     if database_url and database_url.startswith('postgres://'):
         # Fix for Heroku/Render postgres:// vs postgresql:// issue
         database_url = database_url.replace('postgres://', 'postgresql://', 1)
     SQLALCHEMY_DATABASE_URI = database_url
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_recycle': 300,
-        'pool_pre_ping': True
+        'pool_size': int(_ENV.get('DB_POOL_SIZE', 20)),
+        'max_overflow': int(_ENV.get('DB_POOL_OVERFLOW', 30)),
+        'pool_timeout': int(_ENV.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': 1800,
+        'pool_pre_ping': True,
+        # Reuse the most recently returned connection so idle ones can expire
+        'pool_use_lifo': True
     }
+    # Create tables on app startup (otherwise use `flask init-db`)
+    RUN_MIGRATIONS = _ENV.get('RUN_MIGRATIONS', 'False').lower() in ('1', 'true')
 
     # JWT config
-    JWT_SECRET = os.getenv('JWT_SECRET')
+    JWT_SECRET = _ENV.get('JWT_SECRET')
     JWT_ACCESS_TOKEN_EXPIRES_HOURS = 24
     JWT_EMAIL_VERIFICATION_EXPIRES_HOURS = 48
 
+    # argon2id cost parameters (iterations, memory in KiB) - calibrate to the
+    # target login latency on production hardware
+    ARGON2_TIME_COST = int(_ENV.get('ARGON2_TIME_COST', 3))
+    ARGON2_MEMORY_COST = int(_ENV.get('ARGON2_MEMORY_COST', 65536))
+
+    # Seconds a worker may serve a cached public profile; writes made through
+    # the same worker invalidate it at once, 0 disables the cache
+    PROFILE_CACHE_TTL = int(_ENV.get('PROFILE_CACHE_TTL', 60))
+
     # Mail config
-    MAIL_SERVER = os.getenv('MAIL_SERVER')
-    MAIL_PORT = int(os.getenv('MAIL_PORT', 587))
-    MAIL_USERNAME = os.getenv('MAIL_USERNAME')
-    MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
-    MAIL_USE_TLS = os.getenv('MAIL_USE_TLS', 'True').lower() == 'true'
-    MAIL_USE_SSL = os.getenv('MAIL_USE_SSL', 'False').lower() == 'true'
-    MAIL_DEFAULT_SENDER = os.getenv('MAIL_USERNAME')
+    MAIL_SERVER = _ENV.get('MAIL_SERVER')
+    MAIL_PORT = int(_ENV.get('MAIL_PORT', 587))
+    MAIL_USERNAME = _ENV.get('MAIL_USERNAME')
+    MAIL_PASSWORD = _ENV.get('MAIL_PASSWORD')
+    MAIL_USE_TLS = _ENV.get('MAIL_USE_TLS', 'True').lower() == 'true'
+    MAIL_USE_SSL = _ENV.get('MAIL_USE_SSL', 'False').lower() == 'true'
+    MAIL_DEFAULT_SENDER = _ENV.get('MAIL_USERNAME')
 
     # Application config
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file upload
-    CORS_ORIGINS = ['http://localhost:3000', 'http://localhost:5173']  # Common dev ports
+    CORS_ORIGINS = ('http://localhost:3000', 'http://localhost:5173')  # Common dev ports
+    CORS_MAX_AGE = 86400  # Let browsers cache preflight responses for 24h
 
-    @staticmethod
-    def validate_config():
-        """Validate that all required environment variables are set"""
-        required_vars = [
-            'DATABASE_URL',
-            'JWT_SECRET'
-        ]
+    # Required environment variable -> config attribute it populates
+    REQUIRED_SETTINGS = (
+        ('DATABASE_URL', 'SQLALCHEMY_DATABASE_URI'),
+        ('JWT_SECRET', 'JWT_SECRET')
+    )
 
-        missing_vars = []
-        for var in required_vars:
-            if not os.getenv(var):
-                missing_vars.append(var)
+    @classmethod
+    def validate_config(cls):
+        """Validate that all required environment variables are set"""
+        # The class attributes already hold the parsed environment, so check
+        # those instead of querying os.environ again
+        missing_vars = [var for var, attr in cls.REQUIRED_SETTINGS if not getattr(cls, attr, None)]
 
         if missing_vars:
             raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
@@ -64,24 +85,36 @@ class Config:
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
-    CORS_ORIGINS = ['*']  # Allow all origins in development
+    CORS_ORIGINS = ('*',)  # Allow all origins in development
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        **Config.SQLALCHEMY_ENGINE_OPTIONS,
+        'pool_size': int(_ENV.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(_ENV.get('DB_POOL_OVERFLOW', 5))
+    }
 
 
 class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
     # Override CORS_ORIGINS with specific production domains
-    CORS_ORIGINS = [
+    CORS_ORIGINS = (
         'https://yourdomain.com',  # Replace with your actual domain
         'https://www.yourdomain.com',  # With www prefix
         'https://*.vercel.app'  # Vercel preview domains
-    ]
+    )
 
 
 class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'  # In-memory SQLite for tests
+    RUN_MIGRATIONS = True  # Fresh in-memory database needs its tables
+    # Fast hashes for test runs
+    ARGON2_TIME_COST = int(_ENV.get('ARGON2_TIME_COST', 1))
+    ARGON2_MEMORY_COST = int(_ENV.get('ARGON2_MEMORY_COST', 1024))
+    # Let Flask-SQLAlchemy pick its StaticPool for in-memory SQLite - a
+    # pooled (or NullPool) engine would give each connection an empty database
+    SQLALCHEMY_ENGINE_OPTIONS = {}
 
 
 # Configuration dictionary
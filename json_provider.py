@@ -0,0 +1,53 @@
+import decimal
+import orjson
+from flask.json.provider import JSONProvider
+
+
+def _default(obj):
+    """Serialize types orjson doesn't handle natively"""
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class ORJSONProvider(JSONProvider):
+    """JSON provider backed by orjson (much faster than the stdlib json module)"""
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_default).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        """Build the response body straight from orjson's bytes output"""
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=_default),
+            mimetype=self.mimetype
+        )
+
+
+def stream_json_array(items, batch=100):
+    """Encode an iterable as a JSON array for a streamed response.
+
+    Yields one chunk per batch items, so a large result is never held as a
+    whole list or a whole body - but isn't written out one item at a time
+    either.
+    """
+    yield b'['
+    separator = b''
+    chunk = []
+    for item in items:
+        chunk.append(orjson.dumps(item, default=_default))
+        if len(chunk) == batch:
+            yield separator + b','.join(chunk)
+            separator = b','
+            chunk = []
+    if chunk:
+        yield separator + b','.join(chunk)
+    yield b']'
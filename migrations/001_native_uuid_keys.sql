@@ -0,0 +1,36 @@
+-- Convert String(36) ID columns to native UUID (16 bytes instead of 36).
+--
+-- db.create_all() only creates missing tables, so databases created before
+-- the models switched to db.Uuid need this one-off migration:
+--
+--   psql "$DATABASE_URL" -f migrations/001_native_uuid_keys.sql
+--
+-- Foreign keys have to be dropped while both sides change type.
+
+BEGIN;
+
+ALTER TABLE trips DROP CONSTRAINT IF EXISTS trips_user_id_fkey;
+ALTER TABLE messages DROP CONSTRAINT IF EXISTS messages_sender_id_fkey;
+ALTER TABLE messages DROP CONSTRAINT IF EXISTS messages_recipient_id_fkey;
+ALTER TABLE messages DROP CONSTRAINT IF EXISTS messages_trip_id_fkey;
+
+ALTER TABLE users ALTER COLUMN id TYPE uuid USING id::uuid;
+
+ALTER TABLE trips ALTER COLUMN id TYPE uuid USING id::uuid;
+ALTER TABLE trips ALTER COLUMN user_id TYPE uuid USING user_id::uuid;
+
+ALTER TABLE messages ALTER COLUMN id TYPE uuid USING id::uuid;
+ALTER TABLE messages ALTER COLUMN sender_id TYPE uuid USING sender_id::uuid;
+ALTER TABLE messages ALTER COLUMN recipient_id TYPE uuid USING recipient_id::uuid;
+ALTER TABLE messages ALTER COLUMN trip_id TYPE uuid USING trip_id::uuid;
+
+ALTER TABLE trips
+    ADD CONSTRAINT trips_user_id_fkey FOREIGN KEY (user_id) REFERENCES users (id);
+ALTER TABLE messages
+    ADD CONSTRAINT messages_sender_id_fkey FOREIGN KEY (sender_id) REFERENCES users (id);
+ALTER TABLE messages
+    ADD CONSTRAINT messages_recipient_id_fkey FOREIGN KEY (recipient_id) REFERENCES users (id);
+ALTER TABLE messages
+    ADD CONSTRAINT messages_trip_id_fkey FOREIGN KEY (trip_id) REFERENCES trips (id);
+
+COMMIT;
@@ -0,0 +1,15 @@
+-- Store trips.rate_per_kg as integer cents instead of NUMERIC(8,2).
+--
+-- db.create_all() only creates missing tables, so databases created before
+-- the model switched to rate_per_kg_cents need this one-off migration:
+--
+--   psql "$DATABASE_URL" -f migrations/002_rate_per_kg_cents.sql
+
+BEGIN;
+
+ALTER TABLE trips ADD COLUMN rate_per_kg_cents integer;
+UPDATE trips SET rate_per_kg_cents = round(rate_per_kg * 100)::integer;
+ALTER TABLE trips ALTER COLUMN rate_per_kg_cents SET NOT NULL;
+ALTER TABLE trips DROP COLUMN rate_per_kg;
+
+COMMIT;
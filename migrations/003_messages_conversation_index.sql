@@ -0,0 +1,12 @@
+-- Index backing keyset pagination of a conversation's messages.
+--
+-- db.create_all() doesn't add indexes to existing tables, so databases
+-- created before Message.__table_args__ gained this index need:
+--
+--   psql "$DATABASE_URL" -f migrations/003_messages_conversation_index.sql
+--
+-- CONCURRENTLY avoids locking messages against writes while it builds, so
+-- this file must not be run inside a transaction.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_messages_conversation_created
+    ON messages (conversation_id, created_at, id);
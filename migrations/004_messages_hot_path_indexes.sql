@@ -0,0 +1,19 @@
+-- Indexes behind the conversations list and mark-read queries.
+--
+-- db.create_all() doesn't add indexes to existing tables, so databases
+-- created before Message.__table_args__ gained these indexes need:
+--
+--   psql "$DATABASE_URL" -f migrations/004_messages_hot_path_indexes.sql
+--
+-- CONCURRENTLY avoids locking messages against writes while they build, so
+-- this file must not be run inside a transaction.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_messages_sender
+    ON messages (sender_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_messages_recipient
+    ON messages (recipient_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_messages_unread
+    ON messages (recipient_id, conversation_id)
+    WHERE NOT read;
@@ -0,0 +1,56 @@
+-- Materialized per-conversation summaries (models.Conversation).
+--
+-- db.create_all() creates the conversations table on its own, but it can't
+-- backfill it, so existing databases need:
+--
+--   psql "$DATABASE_URL" -f migrations/005_conversation_summaries.sql
+--
+-- Run it while writes are paused: messages sent between the backfill and
+-- the app deploy would otherwise be missing from their summary.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS conversations (
+    id VARCHAR(255) PRIMARY KEY,
+    user1_id UUID NOT NULL REFERENCES users (id),
+    user2_id UUID NOT NULL REFERENCES users (id),
+    last_message TEXT NOT NULL,
+    last_message_time TIMESTAMP NOT NULL,
+    last_sender_id UUID NOT NULL,
+    user1_unread INTEGER NOT NULL DEFAULT 0,
+    user2_unread INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS ix_conversations_user1_time
+    ON conversations (user1_id, last_message_time);
+CREATE INDEX IF NOT EXISTS ix_conversations_user2_time
+    ON conversations (user2_id, last_message_time);
+
+-- user1 is the participant whose ID sorts first, as in conversation_id
+WITH last AS (
+    SELECT DISTINCT ON (conversation_id)
+           conversation_id, sender_id, recipient_id, message, created_at,
+           LEAST(sender_id, recipient_id) AS user1_id,
+           GREATEST(sender_id, recipient_id) AS user2_id
+    FROM messages
+    ORDER BY conversation_id, created_at DESC, id DESC
+), unread AS (
+    SELECT conversation_id, recipient_id, COUNT(*) AS n
+    FROM messages
+    WHERE NOT read
+    GROUP BY conversation_id, recipient_id
+)
+INSERT INTO conversations (id, user1_id, user2_id, last_message, last_message_time,
+                           last_sender_id, user1_unread, user2_unread)
+SELECT l.conversation_id, l.user1_id, l.user2_id, l.message, l.created_at, l.sender_id,
+       COALESCE(u1.n, 0), COALESCE(u2.n, 0)
+FROM last l
+LEFT JOIN unread u1 ON u1.conversation_id = l.conversation_id AND u1.recipient_id = l.user1_id
+LEFT JOIN unread u2 ON u2.conversation_id = l.conversation_id AND u2.recipient_id = l.user2_id
+ON CONFLICT (id) DO NOTHING;
+
+-- The conversations list no longer scans messages by participant
+DROP INDEX IF EXISTS ix_messages_sender;
+DROP INDEX IF EXISTS ix_messages_recipient;
+
+COMMIT;
@@ -0,0 +1,12 @@
+-- Index behind /api/trips/search.
+--
+-- db.create_all() doesn't add indexes to existing tables, so databases
+-- created before Trip.__table_args__ gained this index need:
+--
+--   psql "$DATABASE_URL" -f migrations/007_trips_search_index.sql
+--
+-- CONCURRENTLY avoids locking trips against writes while it builds, so
+-- this file must not be run inside a transaction.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_trips_search
+    ON trips (status, country_from, country_to, date);
@@ -0,0 +1,15 @@
+-- Extend ix_trips_user_status with created_at, so a user's newest trips
+-- (ORDER BY created_at DESC LIMIT n) are read straight off the index.
+--
+--   psql "$DATABASE_URL" -f migrations/008_trips_user_status_created_index.sql
+--
+-- The new index is built under a temporary name before the old one is
+-- dropped, so the per-user queries are never left without an index.
+-- CONCURRENTLY can't run inside a transaction, so neither can this file.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_trips_user_status_new
+    ON trips (user_id, status, created_at);
+
+DROP INDEX CONCURRENTLY IF EXISTS ix_trips_user_status;
+
+ALTER INDEX ix_trips_user_status_new RENAME TO ix_trips_user_status;
@@ -1,22 +1,114 @@
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from sqlalchemy.dialects import postgresql, sqlite
+from dataclasses import dataclass, fields
+from datetime import date, datetime, time, timezone
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Optional
+import re
 import uuid
 
-db = SQLAlchemy()
+# Rows are serialized right after commit (e.g. the created message or trip);
+# every column default is applied client-side, so expiring them would only
+# force a SELECT to re-read what was just written
+db = SQLAlchemy(session_options={'expire_on_commit': False})
+
+# Rows fetched per round-trip when streaming unbounded trip lists
+TRIP_STREAM_BATCH = 100
+
+
+# The form every ID is stored and returned in
+_CANONICAL_UUID_RE = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+
+
+def parse_id(value):
+    """Return value as a canonical UUID string, or None if it isn't a valid UUID"""
+    # IDs echoed back by clients are almost always already canonical - accept
+    # those without building a UUID object
+    if isinstance(value, str) and _CANONICAL_UUID_RE.fullmatch(value):
+        return value
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return None
+
+
+def utcnow():
+    """Current UTC time as a naive datetime, matching the naive DateTime columns.
+
+    utcnow() does the same but is deprecated as of Python 3.12.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# Largest amount in cents an INTEGER column can hold
+MAX_CENTS = 2 ** 31 - 1
+_MAX_AMOUNT = Decimal(MAX_CENTS + 1).scaleb(-2)
+
+
+def to_cents(value):
+    """Convert a decimal currency amount (e.g. "2.50") to integer minor units.
+
+    Rounds half up in decimal, as Postgres round(numeric) does in migration
+    002, so "1.005" is 101 rather than float's 100. Raises ValueError for
+    anything that isn't a finite number and OverflowError past MAX_CENTS.
+    """
+    try:
+        amount = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f"Not a number: {value!r}") from None
+    if not amount.is_finite():
+        raise ValueError(f"Not a finite number: {value!r}")
+    # Compare before scaling - huge exponents overflow the decimal context
+    # in the multiply, and quantize raises past its precision
+    if abs(amount) >= _MAX_AMOUNT:
+        raise OverflowError(f"Amount out of range: {value!r}")
+    cents = int((amount * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+    if abs(cents) > MAX_CENTS:
+        raise OverflowError(f"Amount out of range: {value!r}")
+    return cents
+
+
+def get_by_id(model, value):
+    """Load a row by primary key, treating malformed IDs as not found.
+
+    IDs are native UUID columns, so a malformed ID has to be caught here -
+    Postgres raises on the cast instead of simply matching nothing.
+    """
+    row_id = parse_id(value)
+    return db.session.get(model, row_id) if row_id else None
+
+
+def existing_id(model, value):
+    """Return the canonical ID if a row with that primary key exists, else None.
+
+    Selects only the key column, for existence checks that don't need the
+    rest of the row.
+    """
+    row_id = parse_id(value)
+    if not row_id:
+        return None
+    return db.session.scalar(db.select(model.id).where(model.id == row_id))
+
+
+def display_name(first_name, last_name, email):
+    """Full name, falling back to the local part of the email"""
+    return f"{first_name} {last_name}".strip() or email.split('@')[0]
 
 
 class User(db.Model):
     __tablename__ = 'users'
 
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(db.Uuid(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4()))
     email = db.Column(db.String(255), unique=True, nullable=False)
-    password_hash = db.Column(db.Text, nullable=False)
+    # Only login reads the hash; every other user load (auth on each request,
+    # profiles, message partners) leaves it out of the SELECT
+    password_hash = db.deferred(db.Column(db.Text, nullable=False))
     first_name = db.Column(db.String(100))
     last_name = db.Column(db.String(100))
     phone = db.Column(db.String(20))
     is_verified = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=utcnow)
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow)
 
     # Relationships
     trips = db.relationship('Trip', backref='user', lazy=True, cascade='all, delete-orphan')
@@ -31,62 +123,215 @@ class User(db.Model):
             'last_name': self.last_name,
             'phone': self.phone,
             'is_verified': self.is_verified,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+
+    @property
+    def display_name(self):
+        """Full name, falling back to the local part of the email"""
+        return display_name(self.first_name, self.last_name, self.email)
+
+    def to_summary_dict(self):
+        """The subset of to_dict returned alongside a login token"""
+        return {
+            'id': self.id,
+            'email': self.email,
+            'first_name': self.first_name,
+            'last_name': self.last_name,
+            'is_verified': self.is_verified
+        }
+
+    def to_contact_dict(self):
+        """Who a conversation is with"""
+        return {
+            'id': self.id,
+            'name': self.display_name,
+            'email': self.email
         }
 
 
 class Trip(db.Model):
     __tablename__ = 'trips'
+    __table_args__ = (
+        # A user's trips, optionally by status (my-trips, trip stats, profiles);
+        # created_at lets newest-first pages stop after LIMIT rows
+        db.Index('ix_trips_user_status', 'user_id', 'status', 'created_at'),
+        # /search: every query pins status='active', most add a route or date
+        db.Index('ix_trips_search', 'status', 'country_from', 'country_to', 'date'),
+    )
 
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+    id = db.Column(db.Uuid(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.Uuid(as_uuid=False), db.ForeignKey('users.id'), nullable=False)
     country_from = db.Column(db.String(100), nullable=False)
     country_to = db.Column(db.String(100), nullable=False)
     date = db.Column(db.Date, nullable=False)
     departure_time = db.Column(db.Time)
-    rate_per_kg = db.Column(db.Numeric(8, 2), nullable=False)
+    # Stored in minor units (cents): native integer compares, 4-byte keys
+    rate_per_kg_cents = db.Column(db.Integer, nullable=False)
     available_cargo_space = db.Column(db.Integer, nullable=False)
     description = db.Column(db.Text)
     currency = db.Column(db.String(3), default='EUR')
     contact_info = db.Column(db.Text)
     status = db.Column(db.String(20), default='active')
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=utcnow)
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow)
 
     # Relationships
     messages = db.relationship('Message', backref='trip', lazy=True)
 
     def to_dict(self):
+        return trip_to_dict(self)
+
+    @classmethod
+    def stats_select(cls, user_id):
+        """Per-status trip counts for a user as one aggregate SELECT.
+
+        Run it through stats_for_user, or embed it as a subquery to fetch
+        the counts alongside another row; stats_dict reads either result.
+        """
+        return db.select(*cls._stats_columns()).where(cls.user_id == user_id)
+
+    @classmethod
+    def stats_by_user(cls, user_ids):
+        """Trip stats for several users from one grouped query, keyed by user id"""
+        rows = db.session.execute(
+            db.select(cls.user_id, *cls._stats_columns())
+            .where(cls.user_id.in_(user_ids))
+            .group_by(cls.user_id)
+        )
+        stats = {row.user_id: cls.stats_dict(row) for row in rows}
+        # Users without trips have no group row
+        for user_id in user_ids:
+            if user_id not in stats:
+                stats[user_id] = dict.fromkeys(
+                    ('total_trips', 'active_trips', 'completed_trips', 'cancelled_trips'), 0
+                )
+        return stats
+
+    @classmethod
+    def _stats_columns(cls):
+        count = db.func.count()
+        return (
+            count.label('total'),
+            count.filter(cls.status == 'active').label('active'),
+            count.filter(cls.status == 'completed').label('completed'),
+            count.filter(cls.status == 'cancelled').label('cancelled')
+        )
+
+    @staticmethod
+    def stats_dict(row):
         return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'country_from': self.country_from,
-            'country_to': self.country_to,
-            'date': self.date.isoformat() if self.date else None,
-            'departure_time': self.departure_time.strftime('%H:%M') if self.departure_time else None,
-            'rate_per_kg': float(self.rate_per_kg) if self.rate_per_kg else None,
-            'available_cargo_space': self.available_cargo_space,
-            'description': self.description,
-            'currency': self.currency,
-            'contact_info': self.contact_info,
-            'status': self.status,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'total_trips': row.total,
+            'active_trips': row.active,
+            'completed_trips': row.completed,
+            'cancelled_trips': row.cancelled
         }
 
+    @classmethod
+    def stats_for_user(cls, user_id):
+        """Trip counts per status for a user, from one aggregate query"""
+        return cls.stats_dict(db.session.execute(cls.stats_select(user_id)).one())
+
+
+def trip_to_dict(trip):
+    """Serialize a Trip or TripDTO - anything with the trip column attributes.
+
+    Dates are left as date/datetime objects; the orjson JSON provider writes
+    them as ISO 8601 natively, far cheaper than isoformat() per field.
+    """
+    return {
+        'id': trip.id,
+        'user_id': trip.user_id,
+        'country_from': trip.country_from,
+        'country_to': trip.country_to,
+        'date': trip.date,
+        'departure_time': trip.departure_time.strftime('%H:%M') if trip.departure_time else None,
+        'rate_per_kg': trip.rate_per_kg_cents / 100 if trip.rate_per_kg_cents else None,
+        'available_cargo_space': trip.available_cargo_space,
+        'description': trip.description,
+        'currency': trip.currency,
+        'contact_info': trip.contact_info,
+        'status': trip.status,
+        'created_at': trip.created_at,
+        'updated_at': trip.updated_at
+    }
+
+
+@dataclass(slots=True)
+class TripDTO:
+    """Lightweight read-only trip for list endpoints.
+
+    Loaded from plain column rows, so it skips the ORM instance state and
+    identity-map bookkeeping that full Trip objects carry.
+    """
+    id: str
+    user_id: str
+    country_from: str
+    country_to: str
+    date: date
+    departure_time: Optional[time]
+    rate_per_kg_cents: int
+    available_cargo_space: int
+    description: Optional[str]
+    currency: Optional[str]
+    contact_info: Optional[str]
+    status: Optional[str]
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
+    @classmethod
+    def columns(cls):
+        """The Trip columns backing each field, in field order"""
+        return [getattr(Trip, f.name) for f in fields(cls)]
+
+    @classmethod
+    def query(cls):
+        """Column-only query over trips; add filters, then pass rows to from_row"""
+        return db.session.query(*cls.columns())
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+    @classmethod
+    def iter_by_user(cls, user_id, status=None, batch=TRIP_STREAM_BATCH):
+        """Yield a user's trips newest first, fetching batch rows at a time.
+
+        yield_per streams from a server-side cursor on Postgres instead of
+        buffering the whole result set; callers that need a list call list().
+        """
+        query = cls.query().filter(Trip.user_id == user_id)
+        if status:
+            query = query.filter(Trip.status == status)
+        for row in query.order_by(Trip.created_at.desc()).yield_per(batch):
+            yield cls.from_row(row)
+
+    def to_dict(self):
+        return trip_to_dict(self)
+
 
 class Message(db.Model):
     __tablename__ = 'messages'
+    __table_args__ = (
+        # Keyset pagination of a conversation's history
+        db.Index('ix_messages_conversation_created', 'conversation_id', 'created_at', 'id'),
+        # Partial index over unread rows only, for mark-read
+        db.Index(
+            'ix_messages_unread', 'recipient_id', 'conversation_id',
+            postgresql_where=db.text('NOT read'),
+            sqlite_where=db.text('NOT read')
+        ),
+    )
 
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    sender_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
-    recipient_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
-    trip_id = db.Column(db.String(36), db.ForeignKey('trips.id'))
+    id = db.Column(db.Uuid(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4()))
+    sender_id = db.Column(db.Uuid(as_uuid=False), db.ForeignKey('users.id'), nullable=False)
+    recipient_id = db.Column(db.Uuid(as_uuid=False), db.ForeignKey('users.id'), nullable=False)
+    trip_id = db.Column(db.Uuid(as_uuid=False), db.ForeignKey('trips.id'))
     message = db.Column(db.Text, nullable=False)
     conversation_id = db.Column(db.String(255), nullable=False)
     read = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=utcnow)
 
     def to_dict(self):
         return {
@@ -97,5 +342,92 @@ class Message(db.Model):
             'message': self.message,
             'conversation_id': self.conversation_id,
             'read': self.read,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
\ No newline at end of file
+            'created_at': self.created_at
+        }
+
+
+class Conversation(db.Model):
+    """Per-conversation summary, maintained on every message write.
+
+    Lets the conversations list read one row per conversation instead of
+    ranking and counting a user's whole message history on each request.
+    user1_id is the participant whose ID sorts first (as in conversation_id).
+    """
+    __tablename__ = 'conversations'
+    __table_args__ = (
+        db.Index('ix_conversations_user1_time', 'user1_id', 'last_message_time'),
+        db.Index('ix_conversations_user2_time', 'user2_id', 'last_message_time'),
+    )
+
+    id = db.Column(db.String(255), primary_key=True)  # Message.conversation_id
+    user1_id = db.Column(db.Uuid(as_uuid=False), db.ForeignKey('users.id'), nullable=False)
+    user2_id = db.Column(db.Uuid(as_uuid=False), db.ForeignKey('users.id'), nullable=False)
+    last_message = db.Column(db.Text, nullable=False)
+    last_message_time = db.Column(db.DateTime, nullable=False)
+    last_sender_id = db.Column(db.Uuid(as_uuid=False), nullable=False)
+    user1_unread = db.Column(db.Integer, nullable=False, default=0)
+    user2_unread = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def record_message(cls, message):
+        """Upsert the summary for a new message in the current transaction.
+
+        The recipient's unread count goes up by one; the sender's is reset,
+        matching send_message marking their incoming messages read.
+        """
+        sender_first = message.sender_id < message.recipient_id
+        recipient_unread = 'user2_unread' if sender_first else 'user1_unread'
+        sender_unread = 'user1_unread' if sender_first else 'user2_unread'
+        summary = {
+            'last_message': message.message,
+            'last_message_time': message.created_at,
+            'last_sender_id': message.sender_id
+        }
+
+        dialect = postgresql if db.session.get_bind().dialect.name == 'postgresql' else sqlite
+        stmt = dialect.insert(cls).values(
+            id=message.conversation_id,
+            user1_id=min(message.sender_id, message.recipient_id),
+            user2_id=max(message.sender_id, message.recipient_id),
+            **summary,
+            **{recipient_unread: 1, sender_unread: 0}
+        )
+        # Concurrent sends can reach the row lock out of created_at order, so
+        # only a message at least as new as the stored one replaces the
+        # summary; the unread counts change either way
+        is_newer = stmt.excluded.last_message_time >= cls.last_message_time
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[cls.id],
+            set_={
+                **{
+                    column: db.case((is_newer, getattr(stmt.excluded, column)), else_=getattr(cls, column))
+                    for column in summary
+                },
+                recipient_unread: getattr(cls, recipient_unread) + 1,
+                sender_unread: 0
+            }
+        ))
+
+    @classmethod
+    def clear_unread(cls, conversation_id, user_id):
+        """Reset user_id's unread count for a conversation"""
+        db.session.execute(
+            db.update(cls).where(cls.id == conversation_id).values(
+                user1_unread=db.case((cls.user1_id == user_id, 0), else_=cls.user1_unread),
+                user2_unread=db.case((cls.user2_id == user_id, 0), else_=cls.user2_unread)
+            )
+        )
+
+
+# Built once; each call only binds the email. The unique constraint on
+# users.email already gives Postgres a b-tree index to answer it from.
+# Login checks the password, so the deferred hash is loaded up front; this
+# lives below the models because undefer() needs every mapper configured.
+_USER_BY_EMAIL = db.select(User).options(db.undefer(User.password_hash)).where(
+    User.email == db.bindparam('email')
+)
+
+
+def find_user_by_email(email):
+    """Load a user by (already lowercased) email with its password hash, or None"""
+    return db.session.execute(_USER_BY_EMAIL, {'email': email}).scalar_one_or_none()
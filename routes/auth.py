@@ -1,12 +1,70 @@
 from flask import Blueprint, request, jsonify, current_app
-from models import db, User
+from models import db, User, find_user_by_email
 from auth_guard import token_required, generate_token, generate_verification_token, verify_verification_token
+from routes.users import invalidate_profile
 import bcrypt
-import re
+import os
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHashError
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from email_validator import validate_email, EmailNotValidError
 
 auth_bp = Blueprint('auth', __name__)
 
+# argon2 and bcrypt both release the GIL while hashing, so a thread pool
+# runs hashes in parallel just as well as a process pool without pickling
+# or fork issues. Sizing it to the core count caps concurrent hashes during
+# a signup/login spike, so they queue here instead of starving every other
+# request thread.
+_HASH_POOL = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix='passwords')
+
+
+def _password_hasher():
+    """argon2id hasher with the app's cost parameters, built once per app"""
+    hasher = current_app.extensions.get('password_hasher')
+    if hasher is None:
+        hasher = PasswordHasher(
+            time_cost=current_app.config['ARGON2_TIME_COST'],
+            memory_cost=current_app.config['ARGON2_MEMORY_COST']
+        )
+        current_app.extensions['password_hasher'] = hasher
+    return hasher
+
+
+def _verify(hasher, password, password_hash):
+    # Accounts created before the switch to argon2id still hold bcrypt hashes
+    if password_hash.startswith('$2'):
+        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    try:
+        return hasher.verify(password_hash, password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+
+def hash_password(password):
+    """Hash a password with argon2id on the hashing pool"""
+    return _HASH_POOL.submit(_password_hasher().hash, password).result()
+
+
+def check_password(password, password_hash):
+    """Check a password against its argon2id (or legacy bcrypt) hash on the hashing pool"""
+    return _HASH_POOL.submit(_verify, _password_hasher(), password, password_hash).result()
+
+
+def needs_rehash(password_hash):
+    """True for legacy bcrypt hashes and argon2 hashes with outdated parameters"""
+    return password_hash.startswith('$2') or _password_hasher().check_needs_rehash(password_hash)
+
+
+def _dummy_hash():
+    """A throwaway hash at the app's cost parameters, built once per app"""
+    dummy = current_app.extensions.get('dummy_password_hash')
+    if dummy is None:
+        dummy = hash_password(os.urandom(16).hex())
+        current_app.extensions['dummy_password_hash'] = dummy
+    return dummy
+
 
 def validate_password(password):
     """Validate password strength"""
@@ -15,18 +73,43 @@ def validate_password(password):
     return True, ""
 
 
+@lru_cache(maxsize=4096)
+def is_valid_email(email):
+    """Syntax-check an email address, memoized for repeat logins.
+
+    Deliverability (DNS MX lookup) is skipped - it put a network round-trip
+    on every register and login; a bad address fails at verification anyway.
+    """
+    try:
+        validate_email(email, check_deliverability=False)
+        return True
+    except EmailNotValidError:
+        return False
+
+
+def normalize_email(raw):
+    """Lowercase and validate an email in one step - returns (email, error)"""
+    if not raw:
+        return None, "Email is required"
+    if not isinstance(raw, str):
+        return None, "Invalid email format"
+    email = raw.lower()
+    if not is_valid_email(email):
+        return None, "Invalid email format"
+    return email, None
+
+
 def validate_user_data(data, is_registration=True):
-    """Validate user registration/login data"""
+    """Validate user registration/login data.
+
+    Returns (is_valid, errors, email) with the email already normalized.
+    """
     errors = []
 
     # Email validation
-    if 'email' not in data or not data['email']:
-        errors.append("Email is required")
-    else:
-        try:
-            validate_email(data['email'])
-        except EmailNotValidError:
-            errors.append("Invalid email format")
+    email, error = normalize_email(data.get('email'))
+    if error:
+        errors.append(error)
 
     # Password validation
     if 'password' not in data or not data['password']:
@@ -45,7 +128,7 @@ def validate_user_data(data, is_registration=True):
         if 'phone' in data and data['phone'] and len(data['phone']) > 20:
             errors.append("Phone number must be less than 20 characters")
 
-    return len(errors) == 0, errors
+    return len(errors) == 0, errors, email
 
 
 @auth_bp.route('/register', methods=['POST'])
@@ -55,9 +138,11 @@ def register():
         data = request.get_json()
         if not data:
             return jsonify({"error": "No data provided"}), 400
+        if not isinstance(data, dict):
+            return jsonify({"error": "Invalid request body"}), 400
 
         # Validate input data
-        is_valid, validation_errors = validate_user_data(data, is_registration=True)
+        is_valid, validation_errors, email = validate_user_data(data, is_registration=True)
         if not is_valid:
             return jsonify({
                 "error": "Validation failed",
@@ -65,19 +150,16 @@ def register():
             }), 400
 
         # Check if user already exists
-        existing_user = User.query.filter_by(email=data['email'].lower()).first()
+        existing_user = find_user_by_email(email)
         if existing_user:
             return jsonify({"error": "User with this email already exists"}), 400
 
         # Hash password
-        password_hash = bcrypt.hashpw(
-            data['password'].encode('utf-8'),
-            bcrypt.gensalt()
-        ).decode('utf-8')
+        password_hash = hash_password(data['password'])
 
         # Create new user
         new_user = User(
-            email=data['email'].lower(),
+            email=email,
             password_hash=password_hash,
             first_name=data.get('first_name', ''),
             last_name=data.get('last_name', ''),
@@ -99,9 +181,9 @@ def register():
             "note": "Please verify your email address"
         }), 201
 
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        print(f"Registration error: {e}")
+        current_app.logger.exception("Registration error")
         return jsonify({"error": "Registration failed"}), 500
 
 
@@ -112,9 +194,11 @@ def login():
         data = request.get_json()
         if not data:
             return jsonify({"error": "No data provided"}), 400
+        if not isinstance(data, dict):
+            return jsonify({"error": "Invalid request body"}), 400
 
         # Validate input data
-        is_valid, validation_errors = validate_user_data(data, is_registration=False)
+        is_valid, validation_errors, email = validate_user_data(data, is_registration=False)
         if not is_valid:
             return jsonify({
                 "error": "Validation failed",
@@ -122,14 +206,19 @@ def login():
             }), 400
 
         # Find user
-        user = User.query.filter_by(email=data['email'].lower()).first()
+        user = find_user_by_email(email)
 
-        if not user:
+        # Always hash - checking against a dummy hash for unknown emails
+        # keeps the response time from revealing which accounts exist
+        password_hash = user.password_hash if user else _dummy_hash()
+        if not check_password(data['password'], password_hash) or not user:
             return jsonify({"error": "Invalid email or password"}), 401
 
-        # Check password
-        if not bcrypt.checkpw(data['password'].encode('utf-8'), user.password_hash.encode('utf-8')):
-            return jsonify({"error": "Invalid email or password"}), 401
+        # Opportunistically upgrade bcrypt (or outdated argon2) hashes while
+        # we have the plaintext password
+        if needs_rehash(password_hash):
+            user.password_hash = hash_password(data['password'])
+            db.session.commit()
 
         # Generate token
         token = generate_token(user)
@@ -137,17 +226,11 @@ def login():
         return jsonify({
             "message": "Login successful",
             "token": token,
-            "user": {
-                "id": user.id,
-                "email": user.email,
-                "first_name": user.first_name,
-                "last_name": user.last_name,
-                "is_verified": user.is_verified
-            }
+            "user": user.to_summary_dict()
         }), 200
 
-    except Exception as e:
-        print(f"Login error: {e}")
+    except Exception:
+        current_app.logger.exception("Login error")
         return jsonify({"error": "Login failed"}), 500
 
 
@@ -175,15 +258,16 @@ def verify_email(token):
         # Mark user as verified
         user.is_verified = True
         db.session.commit()
+        invalidate_profile(user.id)
 
         return jsonify({
             "message": "Email verified successfully",
             "user_id": user.id
         }), 200
 
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        print(f"Email verification error: {e}")
+        current_app.logger.exception("Email verification error")
         return jsonify({"error": "Email verification failed"}), 500
 
 
@@ -196,6 +280,14 @@ def get_profile(current_user):
     }), 200
 
 
+# Editable profile fields and their column lengths
+PROFILE_FIELDS = {
+    'first_name': 100,
+    'last_name': 100,
+    'phone': 20
+}
+
+
 @auth_bp.route('/profile', methods=['PUT'])
 @token_required
 def update_profile(current_user):
@@ -205,22 +297,20 @@ def update_profile(current_user):
         if not data:
             return jsonify({"error": "No data provided"}), 400
 
-        # Update allowed fields
-        if 'first_name' in data:
-            current_user.first_name = data['first_name'][:100]
-        if 'last_name' in data:
-            current_user.last_name = data['last_name'][:100]
-        if 'phone' in data:
-            current_user.phone = data['phone'][:20]
+        # Update allowed fields, truncated to their column lengths
+        for field, max_length in PROFILE_FIELDS.items():
+            if field in data:
+                setattr(current_user, field, data[field][:max_length])
 
         db.session.commit()
+        invalidate_profile(current_user.id)
 
         return jsonify({
             "message": "Profile updated successfully",
             "user": current_user.to_dict()
         }), 200
 
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        print(f"Profile update error: {e}")
+        current_app.logger.exception("Profile update error")
         return jsonify({"error": "Profile update failed"}), 500
\ No newline at end of file
@@ -1,17 +1,79 @@
-from flask import Blueprint, request, jsonify
-from models import db, Message, User, Trip
+from flask import Blueprint, request, jsonify, current_app
+from models import db, Conversation, Message, User, Trip, get_by_id, parse_id, utcnow
+from sqlalchemy.orm import load_only
 from auth_guard import token_required
 from datetime import datetime
-from sqlalchemy import or_, and_, desc
+from functools import lru_cache
+from sqlalchemy import or_, and_, desc, case, text
 
 messages_bp = Blueprint('messages', __name__)
 
+MESSAGE_PAGE_SIZE = 50
+MAX_MESSAGE_PAGE_SIZE = 200
 
+
+@lru_cache(maxsize=4096)
 def generate_conversation_id(user1_id, user2_id):
     """Generate a consistent conversation ID for two users"""
-    # Sort IDs to ensure same conversation ID regardless of who starts the conversation
-    ids = sorted([str(user1_id), str(user2_id)])
-    return f"{ids[0]}_{ids[1]}"
+    # Order the IDs so the same conversation ID comes out regardless of who
+    # starts the conversation - one comparison instead of building a list to sort
+    user1_id, user2_id = str(user1_id), str(user2_id)
+    return f"{user1_id}_{user2_id}" if user1_id < user2_id else f"{user2_id}_{user1_id}"
+
+
+def message_cursor(message):
+    """Opaque keyset cursor for a message: <created_at ISO>_<id>"""
+    return f"{message.created_at.isoformat()}_{message.id}"
+
+
+def split_cursor(value):
+    """Split a <timestamp ISO>_<key> cursor into (datetime, key), or None if malformed"""
+    timestamp, _, key = value.partition('_')
+    if not key:
+        return None
+    try:
+        return datetime.fromisoformat(timestamp), key
+    except ValueError:
+        return None
+
+
+def parse_message_cursor(value):
+    """Return (created_at, id) from a message cursor, or None if malformed"""
+    cursor = split_cursor(value)
+    message_id = parse_id(cursor[1]) if cursor else None
+    if not message_id:
+        return None
+    return cursor[0], message_id
+
+
+def conversation_etag(summary, other_user):
+    """Validator for a conversation page, or None if it has no messages yet.
+
+    Covers the last message, both unread counts (read state) and the other
+    user's profile, everything the page shows that can change.
+    """
+    if summary is None:
+        return None
+    updated = other_user.updated_at.timestamp() if other_user.updated_at else 0
+    return (f"{summary.id}:{summary.last_message_time.timestamp()}:"
+            f"{summary.user1_unread}:{summary.user2_unread}:{updated}")
+
+
+def mark_conversation_read(conversation_id, recipient_id, clear_summary=True):
+    """Mark a conversation's unread messages to recipient_id as read.
+
+    A single UPDATE ... WHERE instead of loading each message and flushing
+    a per-row UPDATE; returns the number of rows changed. Also resets the
+    conversation summary's unread count unless clear_summary is False.
+    """
+    updated = Message.query.filter_by(
+        conversation_id=conversation_id,
+        recipient_id=recipient_id,
+        read=False
+    ).update({'read': True}, synchronize_session=False)
+    if updated and clear_summary:
+        Conversation.clear_unread(conversation_id, recipient_id)
+    return updated
 
 
 @messages_bp.route('/send', methods=['POST'])
@@ -37,33 +99,46 @@ def send_message(current_user):
         if len(message_text) > 1000:
             return jsonify({'error': 'Message too long (max 1000 characters)'}), 400
 
-        # Verify recipient exists
-        recipient = User.query.get(data['recipient_id'])
-        if not recipient:
+        # Verify the recipient and the optional trip (for trip context)
+        # exist in one round-trip - each is a scalar subquery that yields
+        # the ID, or NULL if there is no such row
+        recipient_id = parse_id(data['recipient_id'])
+        trip_id = data.get('trip_id')
+        trip_key = parse_id(trip_id) if trip_id else None
+        if recipient_id:
+            recipient_id, trip_key = db.session.execute(db.select(
+                db.select(User.id).where(User.id == recipient_id).scalar_subquery(),
+                db.select(Trip.id).where(Trip.id == trip_key).scalar_subquery()
+            )).one()
+
+        if not recipient_id:
             return jsonify({'error': 'Recipient not found'}), 404
 
         # Prevent self-messaging
-        if str(current_user.id) == str(data['recipient_id']):
+        if current_user.id == recipient_id:
             return jsonify({'error': 'Cannot send message to yourself'}), 400
 
-        # Validate trip exists (optional - for trip context)
-        trip_id = data.get('trip_id')
-        if trip_id:
-            trip = Trip.query.get(trip_id)
-            if not trip:
-                return jsonify({'error': 'Trip not found'}), 404
+        if trip_id and not trip_key:
+            return jsonify({'error': 'Trip not found'}), 404
+        trip_id = trip_key
 
         # Create message
         new_message = Message(
             sender_id=current_user.id,
-            recipient_id=data['recipient_id'],
+            recipient_id=recipient_id,
             trip_id=trip_id,
             message=message_text,
-            conversation_id=generate_conversation_id(current_user.id, data['recipient_id']),
-            read=False
+            conversation_id=generate_conversation_id(current_user.id, recipient_id),
+            read=False,
+            created_at=utcnow()
         )
 
         db.session.add(new_message)
+        # Replying means the sender has seen the conversation, so clear their
+        # unread messages in the same transaction - one commit instead of a
+        # follow-up /mark-read request. record_message resets their count.
+        mark_conversation_read(new_message.conversation_id, current_user.id, clear_summary=False)
+        Conversation.record_message(new_message)
         db.session.commit()
 
         # Return the created message
@@ -75,9 +150,9 @@ def send_message(current_user):
             'message_data': message_response
         }), 201
 
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        print(f"Error sending message: {e}")
+        current_app.logger.exception("Error sending message")
         return jsonify({'error': 'Failed to send message'}), 500
 
 
@@ -87,17 +162,43 @@ def get_conversation(current_user, user_id):
     """Get conversation between current user and specified user"""
     try:
         # Verify other user exists
-        other_user = User.query.get(user_id)
+        other_user = get_by_id(User, user_id)
         if not other_user:
             return jsonify({'error': 'User not found'}), 404
 
         # Generate conversation ID
-        conversation_id = generate_conversation_id(current_user.id, user_id)
-
-        # Get all messages in this conversation
-        messages = Message.query.filter_by(
-            conversation_id=conversation_id
-        ).order_by(Message.created_at.asc()).all()
+        conversation_id = generate_conversation_id(current_user.id, other_user.id)
+
+        # Polling clients revalidate with If-None-Match; the summary row
+        # changes whenever a message is sent or read, so an unchanged tag
+        # means an unchanged page and the message query can be skipped
+        summary = db.session.get(Conversation, conversation_id)
+        etag = conversation_etag(summary, other_user)
+        if etag and request.if_none_match.contains_weak(etag):
+            response = current_app.response_class(status=304)
+            response.set_etag(etag, weak=True)
+            return response
+
+        # One page of messages, newest first from the cursor back; keyset
+        # pagination on (created_at, id) so the cost doesn't grow with history
+        limit = min(max(request.args.get('limit', MESSAGE_PAGE_SIZE, type=int), 1), MAX_MESSAGE_PAGE_SIZE)
+        query = Message.query.filter_by(conversation_id=conversation_id)
+
+        before = request.args.get('before')
+        if before:
+            cursor = parse_message_cursor(before)
+            if not cursor:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            before_time, before_id = cursor
+            query = query.filter(or_(
+                Message.created_at < before_time,
+                and_(Message.created_at == before_time, Message.id < before_id)
+            ))
+
+        messages = query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1).all()
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        messages.reverse()  # Oldest first, as before
 
         # Convert messages to dict and add is_mine flag
         messages_list = []
@@ -106,31 +207,31 @@ def get_conversation(current_user, user_id):
             message_dict['is_mine'] = message.sender_id == current_user.id
             messages_list.append(message_dict)
 
-        # Mark messages as read (messages sent TO current user)
-        unread_messages = Message.query.filter_by(
-            conversation_id=conversation_id,
-            recipient_id=current_user.id,
-            read=False
-        ).all()
-
-        for msg in unread_messages:
-            msg.read = True
-
-        if unread_messages:
+        # Mark messages as read (messages sent TO current user) with one
+        # bulk UPDATE - messages_list keeps the read state they were sent with
+        updated = mark_conversation_read(conversation_id, current_user.id)
+        if updated:
             db.session.commit()
-
-        return jsonify({
+            # The read reset an unread count, so tag the response with the
+            # post-read state - the client's next poll should get a 304.
+            # No summary row (e.g. not backfilled yet) means no ETag at all
+            if summary is not None:
+                db.session.refresh(summary)
+                etag = conversation_etag(summary, other_user)
+
+        response = jsonify({
             'messages': messages_list,
-            'other_user': {
-                'id': other_user.id,
-                'name': f"{other_user.first_name} {other_user.last_name}".strip() or other_user.email.split('@')[0],
-                'email': other_user.email
-            },
-            'conversation_id': conversation_id
-        }), 200
-
-    except Exception as e:
-        print(f"Error getting conversation: {e}")
+            'other_user': other_user.to_contact_dict(),
+            'conversation_id': conversation_id,
+            # Pass back as ?before= to fetch the previous page of history
+            'next_cursor': message_cursor(messages[0]) if has_more else None
+        })
+        if etag:
+            response.set_etag(etag, weak=True)
+        return response, 200
+
+    except Exception:
+        current_app.logger.exception("Error getting conversation")
         return jsonify({'error': 'Failed to get conversation'}), 500
 
 
@@ -139,71 +240,76 @@ def get_conversation(current_user, user_id):
 def get_conversations(current_user):
     """Get list of all conversations for current user"""
     try:
-        # Get all unique conversation IDs where user is involved
-        sent_conversations = db.session.query(Message.conversation_id).filter_by(
-            sender_id=current_user.id
-        ).distinct().subquery()
-
-        received_conversations = db.session.query(Message.conversation_id).filter_by(
-            recipient_id=current_user.id
-        ).distinct().subquery()
-
-        # Get the latest message from each conversation
-        from sqlalchemy import text
-        conversations_query = db.session.execute(text("""
-            SELECT DISTINCT conversation_id,
-                   (SELECT message FROM messages m2 
-                    WHERE m2.conversation_id = m1.conversation_id 
-                    ORDER BY m2.created_at DESC LIMIT 1) as last_message,
-                   (SELECT created_at FROM messages m3 
-                    WHERE m3.conversation_id = m1.conversation_id 
-                    ORDER BY m3.created_at DESC LIMIT 1) as last_message_time,
-                   (SELECT sender_id FROM messages m4 
-                    WHERE m4.conversation_id = m1.conversation_id 
-                    ORDER BY m4.created_at DESC LIMIT 1) as last_sender_id
-            FROM messages m1 
-            WHERE (sender_id = :user_id OR recipient_id = :user_id)
-            ORDER BY last_message_time DESC
-        """), {'user_id': current_user.id})
+        user_id = current_user.id
+        limit = min(max(request.args.get('limit', MESSAGE_PAGE_SIZE, type=int), 1), MAX_MESSAGE_PAGE_SIZE)
+
+        # Read the maintained per-conversation summaries - one indexed row
+        # per conversation instead of ranking the user's message history
+        is_user1 = Conversation.user1_id == user_id
+        query = db.select(
+            Conversation.id.label('conversation_id'),
+            Conversation.last_message,
+            Conversation.last_message_time,
+            Conversation.last_sender_id,
+            case((is_user1, Conversation.user2_id), else_=Conversation.user1_id).label('other_user_id'),
+            case((is_user1, Conversation.user1_unread), else_=Conversation.user2_unread).label('unread_count')
+        ).where(or_(is_user1, Conversation.user2_id == user_id))
+
+        # Keyset pagination on (last_message_time, conversation_id)
+        before = request.args.get('before')
+        if before:
+            cursor = split_cursor(before)
+            if not cursor:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            before_time, before_conversation = cursor
+            query = query.where(or_(
+                Conversation.last_message_time < before_time,
+                and_(Conversation.last_message_time == before_time,
+                     Conversation.id < before_conversation)
+            ))
+
+        conversations_query = db.session.execute(
+            query.order_by(Conversation.last_message_time.desc(), Conversation.id.desc())
+            .limit(limit + 1)
+        ).all()
+        has_more = len(conversations_query) > limit
+        conversations_query = conversations_query[:limit]
+
+        # Load every other participant with one IN query instead of a
+        # lookup per conversation
+        other_ids = {conv.other_user_id for conv in conversations_query}
+        users_by_id = {
+            user.id: user
+            for user in User.query.options(
+                load_only(User.first_name, User.last_name, User.email)
+            ).filter(User.id.in_(other_ids))
+        } if other_ids else {}
 
         conversation_list = []
         for conv in conversations_query:
-            # Determine who the "other user" is
-            conv_parts = conv.conversation_id.split('_')
-            other_user_id = conv_parts[1] if conv_parts[0] == current_user.id else conv_parts[0]
-
-            # Get other user info
-            other_user = User.query.get(other_user_id)
+            other_user = users_by_id.get(conv.other_user_id)
             if not other_user:
                 continue
 
-            # Count unread messages
-            unread_count = Message.query.filter_by(
-                conversation_id=conv.conversation_id,
-                recipient_id=current_user.id,
-                read=False
-            ).count()
-
             conversation_list.append({
                 'conversation_id': conv.conversation_id,
-                'other_user': {
-                    'id': other_user.id,
-                    'name': f"{other_user.first_name} {other_user.last_name}".strip() or other_user.email.split('@')[0],
-                    'email': other_user.email
-                },
+                'other_user': other_user.to_contact_dict(),
                 'last_message': conv.last_message,
-                'last_message_time': conv.last_message_time.isoformat() if conv.last_message_time else None,
-                'unread_count': unread_count,
+                'last_message_time': conv.last_message_time,
+                'unread_count': conv.unread_count,
                 'is_last_message_mine': conv.last_sender_id == current_user.id
             })
 
+        last = conversations_query[-1] if has_more else None
         return jsonify({
             'conversations': conversation_list,
-            'total_conversations': len(conversation_list)
+            'total_conversations': len(conversation_list),
+            # Pass back as ?before= to fetch the next page of conversations
+            'next_cursor': f"{last.last_message_time.isoformat()}_{last.conversation_id}" if last else None
         }), 200
 
-    except Exception as e:
-        print(f"Error getting conversations: {e}")
+    except Exception:
+        current_app.logger.exception("Error getting conversations")
         return jsonify({'error': 'Failed to get conversations'}), 500
 
 
@@ -218,26 +324,24 @@ def mark_messages_as_read(current_user):
         if not conversation_id:
             return jsonify({'error': 'conversation_id is required'}), 400
 
-        # Mark all unread messages in this conversation as read
-        unread_messages = Message.query.filter_by(
-            conversation_id=conversation_id,
-            recipient_id=current_user.id,
-            read=False
-        ).all()
-
-        for message in unread_messages:
-            message.read = True
+        # Read flags are idempotent and cheap to lose in a crash, so don't
+        # wait for the WAL flush on this commit (Postgres only; scoped to
+        # this transaction, /send keeps the durable default)
+        if db.session.get_bind().dialect.name == 'postgresql':
+            db.session.execute(text('SET LOCAL synchronous_commit = off'))
 
+        # Mark all unread messages in this conversation as read
+        updated = mark_conversation_read(conversation_id, current_user.id)
         db.session.commit()
 
         return jsonify({
             'message': 'Messages marked as read',
-            'updated_count': len(unread_messages)
+            'updated_count': updated
         }), 200
 
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        print(f"Error marking messages as read: {e}")
+        current_app.logger.exception("Error marking messages as read")
         return jsonify({'error': 'Failed to mark messages as read'}), 500
 
 
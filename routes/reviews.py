@@ -1,33 +1,61 @@
 # routes/reviews.py
-from flask import Blueprint, request, jsonify
-from bson import ObjectId
+from flask import Blueprint, request, jsonify, current_app
+from werkzeug.http import generate_etag
 from auth_guard import token_required
-from db import get_database
+from models import User, existing_id
 from datetime import datetime
+import orjson
 
 reviews_bp = Blueprint('reviews', __name__)
 
 
-def get_db():
-    """Get database connection"""
-    return get_database()
+def _static_payload(data):
+    """Serialize a constant body once, paired with its content-hashed ETag"""
+    body = orjson.dumps(data)
+    return body, generate_etag(body)
+
+
+# Placeholder payloads, serialized once at import while reviews are stubbed
+_EMPTY_REVIEWS = _static_payload([])
+_DEFAULT_STATS = _static_payload({
+    'total_reviews': 0,
+    'average_rating': 0.0,
+    'rating_breakdown': {
+        '5': 0,
+        '4': 0,
+        '3': 0,
+        '2': 0,
+        '1': 0
+    }
+})
+_NO_MY_REVIEWS = _static_payload({
+    'reviews': [],
+    'count': 0,
+    'message': 'Review system not yet implemented'
+})
+
+
+def _static_json(payload):
+    """Response for a pre-serialized JSON body, answering 304 to a matching If-None-Match"""
+    body, etag = payload
+    response = current_app.response_class(body, mimetype='application/json')
+    # Precomputed ETag so polling clients get a bodyless 304 without rehashing
+    response.set_etag(etag)
+    return response.make_conditional(request)
 
 
 @reviews_bp.route('/user/<user_id>', methods=['GET'])
 def get_user_reviews(user_id):
     """Get reviews for a specific user"""
     try:
-        db = get_db()
-
         # For now, return empty array since we haven't implemented reviews yet
         # This is a placeholder that allows the frontend to work
 
-        # In the future, this would query a reviews collection:
-        # reviews_collection = db.reviews
-        # reviews = list(reviews_collection.find({"reviewed_user_id": ObjectId(user_id)}).sort("created_at", -1).limit(10))
-
-        # Mock data structure for future implementation:
-        mock_reviews = []
+        # In the future, this would query a reviews table:
+        # reviews = db.session.execute(
+        #     select(Review).where(Review.reviewed_user_id == user_id)
+        #     .order_by(Review.created_at.desc()).limit(10)
+        # ).scalars().all()
 
         # Uncomment this when you want to test with sample data:
         # mock_reviews = [
@@ -49,10 +77,10 @@ def get_user_reviews(user_id):
         #     }
         # ]
 
-        return jsonify(mock_reviews), 200
+        return _static_json(_EMPTY_REVIEWS)
 
-    except Exception as e:
-        print(f"Error fetching reviews: {e}")
+    except Exception:
+        current_app.logger.exception("Error fetching reviews")
         return jsonify({'error': 'Server error'}), 500
 
 
@@ -84,30 +112,18 @@ def add_review(current_user):
         if len(review_text) > 500:
             return jsonify({'error': 'Review cannot exceed 500 characters'}), 400
 
-        # Get current user info
-        db = get_db()
-        users_collection = db.users
-
-        if isinstance(current_user, str):
-            user = users_collection.find_one({"email": current_user})
-        else:
-            user = current_user
-
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
+        # Check if reviewed user exists
+        reviewed_user_id = existing_id(User, data['reviewed_user_id'])
+        if not reviewed_user_id:
+            return jsonify({'error': 'Reviewed user not found'}), 404
 
         # Prevent self-reviews
-        if str(data['reviewed_user_id']) == str(user['_id']):
+        if reviewed_user_id == current_user.id:
             return jsonify({'error': 'Cannot review yourself'}), 400
 
-        # Check if reviewed user exists
-        reviewed_user = users_collection.find_one({"_id": ObjectId(data['reviewed_user_id'])})
-        if not reviewed_user:
-            return jsonify({'error': 'Reviewed user not found'}), 404
-
         # For now, just return success message
         # In future implementation, you would:
-        # 1. Create reviews collection
+        # 1. Create reviews table
         # 2. Check if user already reviewed this person for this trip
         # 3. Insert the review
         # 4. Update user's average rating
@@ -117,8 +133,8 @@ def add_review(current_user):
             'note': 'This endpoint is ready for future development'
         }), 200
 
-    except Exception as e:
-        print(f"Error adding review: {e}")
+    except Exception:
+        current_app.logger.exception("Error adding review")
         return jsonify({'error': 'Server error'}), 500
 
 
@@ -126,21 +142,9 @@ def add_review(current_user):
 def get_review_stats(user_id):
     """Get review statistics for a user"""
     try:
-        # For now, return default stats
+        # For now, return default stats (_DEFAULT_STATS)
         # In future implementation, this would calculate real statistics
 
-        default_stats = {
-            'total_reviews': 0,
-            'average_rating': 0.0,
-            'rating_breakdown': {
-                '5': 0,
-                '4': 0,
-                '3': 0,
-                '2': 0,
-                '1': 0
-            }
-        }
-
         # Mock data for testing (uncomment to test):
         # default_stats = {
         #     'total_reviews': 15,
@@ -154,10 +158,10 @@ def get_review_stats(user_id):
         #     }
         # }
 
-        return jsonify(default_stats), 200
+        return _static_json(_DEFAULT_STATS)
 
-    except Exception as e:
-        print(f"Error fetching review stats: {e}")
+    except Exception:
+        current_app.logger.exception("Error fetching review stats")
         return jsonify({'error': 'Server error'}), 500
 
 
@@ -169,14 +173,10 @@ def get_my_reviews(current_user):
         # For now, return empty array
         # In future implementation, this would query reviews by reviewer_id
 
-        return jsonify({
-            'reviews': [],
-            'count': 0,
-            'message': 'Review system not yet implemented'
-        }), 200
+        return _static_json(_NO_MY_REVIEWS)
 
-    except Exception as e:
-        print(f"Error fetching my reviews: {e}")
+    except Exception:
+        current_app.logger.exception("Error fetching my reviews")
         return jsonify({'error': 'Server error'}), 500
 
 # Future endpoints for full review system:
@@ -1,13 +1,30 @@
-from flask import Blueprint, request, jsonify
-from models import db, Trip, User
+from flask import Blueprint, request, jsonify, current_app, stream_with_context
+from models import (
+    db, Message, Trip, TripDTO, User, display_name, existing_id, parse_id,
+    to_cents, TRIP_STREAM_BATCH
+)
 from auth_guard import token_required, optional_token
+from json_provider import stream_json_array
+from routes.users import invalidate_profile
 from datetime import datetime, date
-import re
+from functools import lru_cache
 from sqlalchemy import and_, or_
 
 trips_bp = Blueprint('trips', __name__)
 
 
+def is_valid_time(value):
+    """True for a 24-hour H:MM / HH:MM string, checked without a regex"""
+    if not isinstance(value, str):
+        return False
+    hours, sep, minutes = value.partition(':')
+    return (
+        sep == ':' and 1 <= len(hours) <= 2 and len(minutes) == 2
+        and value.isascii() and hours.isdigit() and minutes.isdigit()
+        and int(hours) < 24 and int(minutes) < 60
+    )
+
+
 def validate_trip_data(data):
     """Validate trip creation/update data"""
     errors = []
@@ -18,15 +35,22 @@ def validate_trip_data(data):
         if field not in data or not data[field]:
             errors.append(f"{field} is required")
 
+    # Nothing below is worth running on an incomplete payload
+    if errors:
+        return False, errors
+
     # Validate date format (DDMMYYYY)
     if 'date' in data and data['date']:
-        date_pattern = r'^\d{8}$'  # DDMMYYYY format
-        if not re.match(date_pattern, str(data['date'])):
+        date_str = str(data['date'])
+        # Plain string predicates instead of a regex; isascii keeps out
+        # non-ASCII digits that isdigit() (and \d) would accept
+        if len(date_str) != 8 or not (date_str.isascii() and date_str.isdigit()):
             errors.append("Date must be in DDMMYYYY format")
         else:
+            # One clock read for both the year and the past-date checks
+            today = date.today()
             try:
                 # Parse DDMMYYYY format
-                date_str = str(data['date'])
                 day = int(date_str[:2])
                 month = int(date_str[2:4])
                 year = int(date_str[4:8])
@@ -36,30 +60,31 @@ def validate_trip_data(data):
                     errors.append("Invalid day in date")
                 elif not (1 <= month <= 12):
                     errors.append("Invalid month in date")
-                elif year < datetime.now().year:
+                elif year < today.year:
                     errors.append("Year cannot be in the past")
                 else:
                     # Check if date is valid and not in the past
                     trip_date = date(year, month, day)
-                    if trip_date < date.today():
+                    if trip_date < today:
                         errors.append("Date cannot be in the past")
             except ValueError:
                 errors.append("Invalid date")
 
     # Validate departure time format (HH:MM)
     if 'departure_time' in data and data['departure_time']:
-        time_pattern = r'^([01]?[0-9]|2[0-3]):[0-5][0-9]$'
-        if not re.match(time_pattern, data['departure_time']):
+        if not is_valid_time(data['departure_time']):
             errors.append("Departure time must be in HH:MM format")
 
     # Validate numeric fields
     if 'rate_per_kg' in data:
+        # Same conversion add_trip stores, so whatever passes here fits the column
         try:
-            rate = float(data['rate_per_kg'])
-            if rate <= 0:
+            if to_cents(data['rate_per_kg']) <= 0:
                 errors.append("Rate per kg must be greater than 0")
-        except (ValueError, TypeError):
+        except ValueError:
             errors.append("Rate per kg must be a valid number")
+        except OverflowError:
+            errors.append("Rate per kg is too large")
 
     if 'available_cargo_space' in data:
         try:
@@ -85,10 +110,14 @@ def validate_trip_data(data):
     return len(errors) == 0, errors
 
 
+@lru_cache(maxsize=4096)
 def parse_date_from_ddmmyyyy(date_str):
-    """Convert DDMMYYYY string to date object"""
+    """Convert DDMMYYYY string to date object.
+
+    Memoized - searches repeat the same few dates. Pass a str, so that the
+    cache key is always hashable.
+    """
     try:
-        date_str = str(date_str)
         day = int(date_str[:2])
         month = int(date_str[2:4])
         year = int(date_str[4:8])
@@ -97,6 +126,23 @@ def parse_date_from_ddmmyyyy(date_str):
         return None
 
 
+def trips_with_owner(query):
+    """Join the owner's first_name, last_name and email onto a TripDTO query.
+
+    They come back as the last three columns of each row, after the trip.
+    """
+    return query.join(User, User.id == Trip.user_id).add_columns(
+        User.first_name, User.last_name, User.email
+    )
+
+
+def trip_not_owned(trip_id):
+    """404 or 403 for a trip write that matched no rows owned by the caller"""
+    if not existing_id(Trip, trip_id):
+        return jsonify({"error": "Trip not found"}), 404
+    return jsonify({"error": "Unauthorized - not your trip"}), 403
+
+
 @trips_bp.route('/add', methods=['POST'])
 @token_required
 def add_trip(current_user):
@@ -112,7 +158,7 @@ def add_trip(current_user):
             return jsonify({"error": "Validation failed", "details": validation_errors}), 400
 
         # Parse date
-        trip_date = parse_date_from_ddmmyyyy(data['date'])
+        trip_date = parse_date_from_ddmmyyyy(str(data['date']))
         if not trip_date:
             return jsonify({"error": "Invalid date format"}), 400
 
@@ -132,7 +178,7 @@ def add_trip(current_user):
             country_to=data['country_to'],
             date=trip_date,
             departure_time=departure_time,
-            rate_per_kg=float(data['rate_per_kg']),
+            rate_per_kg_cents=to_cents(data['rate_per_kg']),
             available_cargo_space=int(data['available_cargo_space']),
             description=data.get('description', ''),
             currency=data.get('currency', 'EUR'),
@@ -142,6 +188,7 @@ def add_trip(current_user):
 
         db.session.add(new_trip)
         db.session.commit()
+        invalidate_profile(current_user.id)
 
         return jsonify({
             "message": "Trip created successfully",
@@ -149,9 +196,9 @@ def add_trip(current_user):
             "trip": new_trip.to_dict()
         }), 201
 
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        print(f"Error creating trip: {e}")
+        current_app.logger.exception("Error creating trip")
         return jsonify({"error": "Failed to create trip"}), 500
 
 
@@ -161,7 +208,7 @@ def search_trips(current_user):
     """Search for trips with optional filters - excludes current user's own trips"""
     try:
         # Build query
-        query = Trip.query.filter(Trip.status == 'active')
+        query = TripDTO.query().filter(Trip.status == 'active')
 
         # Exclude current user's trips if user is logged in
         if current_user:
@@ -185,8 +232,8 @@ def search_trips(current_user):
         max_rate = request.args.get('max_rate')
         if max_rate:
             try:
-                query = query.filter(Trip.rate_per_kg <= float(max_rate))
-            except ValueError:
+                query = query.filter(Trip.rate_per_kg_cents <= to_cents(max_rate))
+            except (ValueError, OverflowError):
                 pass
 
         min_space = request.args.get('min_space')
@@ -196,23 +243,28 @@ def search_trips(current_user):
             except ValueError:
                 pass
 
-        # Execute query and get results
-        trips = query.order_by(Trip.created_at.desc()).all()
-
-        # Convert to dict and add user info
-        trips_list = []
-        for trip in trips:
-            trip_dict = trip.to_dict()
-            # Add user name for display
-            user = User.query.get(trip.user_id)
-            if user:
-                trip_dict['user_name'] = f"{user.first_name} {user.last_name}".strip() or user.email.split('@')[0]
-            trips_list.append(trip_dict)
-
-        return jsonify(trips_list), 200
-
-    except Exception as e:
-        print(f"Error searching trips: {e}")
+        # Join in the owner's name columns so results and user names come
+        # back in one round trip, still streamed in batches. iter() runs the
+        # query here, so database errors still get the 500 below
+        rows = iter(trips_with_owner(query).order_by(Trip.created_at.desc()).yield_per(TRIP_STREAM_BATCH))
+
+        def trip_dicts():
+            # Convert to dict and add user name for display
+            for row in rows:
+                trip_dict = TripDTO.from_row(row[:-3]).to_dict()
+                trip_dict['user_name'] = display_name(*row[-3:])
+                yield trip_dict
+
+        # Encode each fetched batch as it arrives instead of building the
+        # whole list and body first; stream_with_context keeps the session
+        # open until the last row is read
+        return current_app.response_class(
+            stream_with_context(stream_json_array(trip_dicts(), TRIP_STREAM_BATCH)),
+            mimetype='application/json'
+        ), 200
+
+    except Exception:
+        current_app.logger.exception("Error searching trips")
         return jsonify({"error": "Failed to search trips"}), 500
 
 
@@ -223,12 +275,9 @@ def get_my_trips(current_user):
     try:
         status_filter = request.args.get('status', 'all')
 
-        query = Trip.query.filter_by(user_id=current_user.id)
-
-        if status_filter != 'all':
-            query = query.filter_by(status=status_filter)
-
-        trips = query.order_by(Trip.created_at.desc()).all()
+        trips = TripDTO.iter_by_user(
+            current_user.id, None if status_filter == 'all' else status_filter
+        )
         trips_list = [trip.to_dict() for trip in trips]
 
         return jsonify({
@@ -236,8 +285,8 @@ def get_my_trips(current_user):
             "count": len(trips_list)
         }), 200
 
-    except Exception as e:
-        print(f"Error getting user trips: {e}")
+    except Exception:
+        current_app.logger.exception("Error getting user trips")
         return jsonify({"error": "Failed to get trips"}), 500
 
 
@@ -245,23 +294,23 @@ def get_my_trips(current_user):
 def get_trip(trip_id):
     """Get specific trip by ID"""
     try:
-        trip = Trip.query.get(trip_id)
+        # Trip columns plus the owner's name and email in one row, without
+        # building ORM instances for either
+        row = trips_with_owner(TripDTO.query()).filter(Trip.id == parse_id(trip_id)).first()
 
-        if not trip:
+        if not row:
             return jsonify({"error": "Trip not found"}), 404
 
-        trip_dict = trip.to_dict()
+        trip_dict = TripDTO.from_row(row[:-3]).to_dict()
 
         # Add user info
-        user = User.query.get(trip.user_id)
-        if user:
-            trip_dict['user_name'] = f"{user.first_name} {user.last_name}".strip() or user.email.split('@')[0]
-            trip_dict['user_email'] = user.email
+        trip_dict['user_name'] = display_name(*row[-3:])
+        trip_dict['user_email'] = row.email
 
         return jsonify(trip_dict), 200
 
-    except Exception as e:
-        print(f"Error getting trip: {e}")
+    except Exception:
+        current_app.logger.exception("Error getting trip")
         return jsonify({"error": "Failed to get trip"}), 500
 
 
@@ -269,23 +318,24 @@ def get_trip(trip_id):
 def get_user_trips(user_id):
     """Get trips by specific user (for public profile)"""
     try:
-        # Verify user exists
-        user = User.query.get(user_id)
-        if not user:
+        # Verify user exists - only the id is needed
+        user_id = existing_id(User, user_id)
+        if not user_id:
             return jsonify({"error": "User not found"}), 404
 
-        # Get user's active trips
-        trips = Trip.query.filter_by(
-            user_id=user_id,
-            status='active'
-        ).order_by(Trip.created_at.desc()).limit(10).all()
+        # Get user's 10 newest active trips; the limit runs in the database,
+        # reading the first rows of ix_trips_user_status
+        rows = TripDTO.query().filter(
+            Trip.user_id == user_id,
+            Trip.status == 'active'
+        ).order_by(Trip.created_at.desc()).limit(10)
 
-        trips_list = [trip.to_dict() for trip in trips]
+        trips_list = [TripDTO.from_row(row).to_dict() for row in rows]
 
         return jsonify(trips_list), 200
 
-    except Exception as e:
-        print(f"Error getting user trips: {e}")
+    except Exception:
+        current_app.logger.exception("Error getting user trips")
         return jsonify({"error": "Failed to get user trips"}), 500
 
 
@@ -294,14 +344,6 @@ def get_user_trips(user_id):
 def update_trip(current_user, trip_id):
     """Update a trip"""
     try:
-        trip = Trip.query.get(trip_id)
-
-        if not trip:
-            return jsonify({"error": "Trip not found"}), 404
-
-        if trip.user_id != current_user.id:
-            return jsonify({"error": "Unauthorized - not your trip"}), 403
-
         data = request.json
         if not data:
             return jsonify({"error": "No data provided"}), 400
@@ -313,30 +355,50 @@ def update_trip(current_user, trip_id):
             'contact_info', 'departure_time', 'status'
         ]
 
+        values = {}
         for field in updatable_fields:
             if field in data:
                 if field == 'date' and data[field]:
-                    trip_date = parse_date_from_ddmmyyyy(data[field])
+                    trip_date = parse_date_from_ddmmyyyy(str(data[field]))
                     if trip_date:
-                        trip.date = trip_date
+                        values['date'] = trip_date
                 elif field == 'departure_time' and data[field]:
                     try:
-                        trip.departure_time = datetime.strptime(data[field], '%H:%M').time()
+                        values['departure_time'] = datetime.strptime(data[field], '%H:%M').time()
                     except ValueError:
                         return jsonify({"error": "Invalid departure time format"}), 400
+                elif field == 'rate_per_kg':
+                    try:
+                        values['rate_per_kg_cents'] = to_cents(data[field])
+                    except (ValueError, TypeError, OverflowError):
+                        return jsonify({"error": "Rate per kg must be a valid number"}), 400
                 else:
-                    setattr(trip, field, data[field])
+                    values[field] = data[field]
+
+        # Ownership is part of the WHERE clause, so the check and the write
+        # are one statement; RETURNING hands back the updated row
+        row = db.session.execute(
+            db.update(Trip)
+            .where(Trip.id == parse_id(trip_id), Trip.user_id == current_user.id)
+            .values(**values)
+            .returning(*TripDTO.columns())
+        ).first()
+
+        if not row:
+            db.session.rollback()
+            return trip_not_owned(trip_id)
 
         db.session.commit()
+        invalidate_profile(current_user.id)
 
         return jsonify({
             "message": "Trip updated successfully",
-            "trip": trip.to_dict()
+            "trip": TripDTO.from_row(row).to_dict()
         }), 200
 
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        print(f"Error updating trip: {e}")
+        current_app.logger.exception("Error updating trip")
         return jsonify({"error": "Failed to update trip"}), 500
 
 
@@ -345,22 +407,29 @@ def update_trip(current_user, trip_id):
 def delete_trip(current_user, trip_id):
     """Delete a trip"""
     try:
-        trip = Trip.query.get(trip_id)
-
-        if not trip:
-            return jsonify({"error": "Trip not found"}), 404
+        owned = and_(Trip.id == parse_id(trip_id), Trip.user_id == current_user.id)
+
+        # Detach the trip's messages first, as the ORM delete used to -
+        # the subquery limits this to a trip the caller owns
+        db.session.execute(
+            db.update(Message)
+            .where(Message.trip_id.in_(db.select(Trip.id).where(owned)))
+            .values(trip_id=None)
+        )
+        deleted = db.session.execute(db.delete(Trip).where(owned)).rowcount
 
-        if trip.user_id != current_user.id:
-            return jsonify({"error": "Unauthorized - not your trip"}), 403
+        if not deleted:
+            db.session.rollback()
+            return trip_not_owned(trip_id)
 
-        db.session.delete(trip)
         db.session.commit()
+        invalidate_profile(current_user.id)
 
         return jsonify({"message": "Trip deleted successfully"}), 200
 
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        print(f"Error deleting trip: {e}")
+        current_app.logger.exception("Error deleting trip")
         return jsonify({"error": "Failed to delete trip"}), 500
 
 
@@ -369,17 +438,10 @@ def delete_trip(current_user, trip_id):
 def get_trip_stats(current_user):
     """Get trip statistics for current user"""
     try:
-        total_trips = Trip.query.filter_by(user_id=current_user.id).count()
-        active_trips = Trip.query.filter_by(user_id=current_user.id, status='active').count()
+        return jsonify(Trip.stats_for_user(current_user.id)), 200
 
-        return jsonify({
-            "total_trips": total_trips,
-            "active_trips": active_trips,
-            "completed_trips": total_trips - active_trips
-        }), 200
-
-    except Exception as e:
-        print(f"Error getting trip stats: {e}")
+    except Exception:
+        current_app.logger.exception("Error getting trip stats")
         return jsonify({"error": "Failed to get trip statistics"}), 500
 
 
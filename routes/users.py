@@ -1,55 +1,131 @@
-from flask import Blueprint, request, jsonify
-from models import db, User, Trip
+from flask import Blueprint, request, jsonify, current_app
+from models import db, User, Trip, TripDTO, parse_id
+import itertools
+import time
 
 users_bp = Blueprint('users', __name__)
 
+# Serialized public profiles: user_id -> (expires_at, JSON body). Profile
+# edits and trip writes call invalidate_profile; other workers may serve a
+# stale copy for up to PROFILE_CACHE_TTL seconds
+_profile_cache = {}
+PROFILE_CACHE_SIZE = 10000
+
+# user_id -> tag of its last invalidation. A fill only stores its body if the
+# tag is unchanged since before its query, so a read racing a write can't
+# cache the pre-write profile
+_profile_generation = {}
+_invalidations = itertools.count(1)
+
+
+# Most profiles a single /profiles request may ask for
+MAX_BATCH_PROFILES = 100
+
+
+def invalidate_profile(user_id):
+    """Drop a user's cached public profile after a write that changes it"""
+    _profile_generation[user_id] = next(_invalidations)
+    _profile_cache.pop(user_id, None)
+
+
+def public_profile_dict(user):
+    """A user's basic public info, as shown on their profile"""
+    return {
+        'id': user.id,
+        'name': f"{user.first_name} {user.last_name}".strip() or 'Anonymous User',
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'email': user.email,
+        'phone': user.phone,
+        'member_since': user.created_at,
+        'is_verified': user.is_verified
+    }
+
 
 @users_bp.route('/profile/<user_id>', methods=['GET'])
 def get_public_profile(user_id):
     """Get public profile of a user"""
     try:
-        # Find user
-        user = User.query.get(user_id)
+        # Find user, with their trip counts from the same round trip - the
+        # aggregate subquery always yields exactly one row to join against
+        row_id = parse_id(user_id)
+        cached = _profile_cache.get(row_id)
+        if cached and cached[0] > time.monotonic():
+            return current_app.response_class(cached[1], mimetype='application/json')
+        generation = _profile_generation.get(row_id)
 
-        if not user:
+        stats = Trip.stats_select(row_id).subquery()
+        row = db.session.execute(
+            db.select(User, stats).select_from(User).join(stats, db.true()).where(User.id == row_id)
+        ).first() if row_id else None
+
+        if not row:
             return jsonify({
                 'error': 'User not found',
                 'message': 'This user account no longer exists',
                 'user_id': user_id
             }), 404
 
+        user = row.User
+
         # Get user's basic public info
-        profile_data = {
-            'id': user.id,
-            'name': f"{user.first_name} {user.last_name}".strip() or 'Anonymous User',
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-            'email': user.email,
-            'phone': user.phone,
-            'member_since': user.created_at.isoformat() if user.created_at else None,
-            'is_verified': user.is_verified
-        }
+        profile_data = public_profile_dict(user)
 
         # Get user's trip statistics
-        total_trips = Trip.query.filter_by(user_id=user_id).count()
-        active_trips = Trip.query.filter_by(user_id=user_id, status='active').count()
-
-        profile_data['trip_stats'] = {
-            'total_trips': total_trips,
-            'active_trips': active_trips,
-            'completed_trips': total_trips - active_trips
-        }
+        profile_data['trip_stats'] = Trip.stats_dict(row)
 
         # Get recent trips (last 5 active trips)
-        recent_trips = Trip.query.filter_by(
-            user_id=user_id,
-            status='active'
-        ).order_by(Trip.created_at.desc()).limit(5).all()
+        recent_trips = TripDTO.query().filter(
+            Trip.user_id == user.id,
+            Trip.status == 'active'
+        ).order_by(Trip.created_at.desc()).limit(5)
+
+        profile_data['recent_trips'] = [TripDTO.from_row(row).to_dict() for row in recent_trips]
+
+        response = jsonify(profile_data)
+        ttl = current_app.config['PROFILE_CACHE_TTL']
+        if ttl and _profile_generation.get(user.id) == generation:
+            if len(_profile_cache) >= PROFILE_CACHE_SIZE:
+                # Evict the oldest entry (dicts keep insertion order)
+                _profile_cache.pop(next(iter(_profile_cache)), None)
+            _profile_cache[user.id] = (time.monotonic() + ttl, response.get_data())
+        return response, 200
+
+    except Exception:
+        current_app.logger.exception("Error getting public profile")
+        return jsonify({'error': 'Failed to get user profile'}), 500
+
+
+@users_bp.route('/profiles', methods=['POST'])
+def get_public_profiles():
+    """Get public profiles and trip stats for a list of user IDs"""
+    try:
+        data = request.get_json(silent=True)
+        ids = data.get('ids') if isinstance(data, dict) else None
+
+        if not isinstance(ids, list):
+            return jsonify({'error': 'ids must be a list of user IDs'}), 400
+        if len(ids) > MAX_BATCH_PROFILES:
+            return jsonify({'error': f'At most {MAX_BATCH_PROFILES} ids per request'}), 400
+
+        # Malformed IDs can't match a user; skip them like unknown ones
+        user_ids = {row_id for row_id in map(parse_id, ids) if row_id}
+        if not user_ids:
+            return jsonify({'profiles': {}}), 200
+
+        # Two queries for the whole batch: the users, then every user's
+        # trip counts grouped by user
+        users = User.query.filter(User.id.in_(user_ids)).all()
+        stats_by_user = Trip.stats_by_user(user_ids)
 
-        profile_data['recent_trips'] = [trip.to_dict() for trip in recent_trips]
+        profiles = {}
+        for user in users:
+            profile_data = public_profile_dict(user)
+            profile_data['trip_stats'] = stats_by_user[user.id]
+            profiles[user.id] = profile_data
 
-        return jsonify(profile_data), 200
+        return jsonify({'profiles': profiles}), 200
 
-    except Exception as e:
-        print(f"Error getting public profile: {e}")
-        return jsonify({'error': 'Failed to get user profile'}), 500
\ No newline at end of file
+    except Exception:
+        current_app.logger.exception("Error getting public profiles")
+        return jsonify({'error': 'Failed to get user profiles'}), 500